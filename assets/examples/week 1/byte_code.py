@@ -1,11 +1,196 @@
-import dis, inspect
-import example_module
-
-for name, f in inspect.getmembers(example_module, inspect.isfunction):
-    source = ''.join([str(l) for l in inspect.getsourcelines(f)[0]])
-    print(f"\n\n```python\n{source}\n```")
-    code = dis.Bytecode(f)
-    print(f'```plaintext\n \tOPCODE\tOPNAME        \t\tARG\tARGVAL')
-    for op in code:
-        print(f'{op.offset}\t{op.opcode}\t{op.opname.ljust(20)}\t{op.arg}\t{op.argval}')
-    print("```")
\ No newline at end of file
+"""
+Report on the bytecode and cost of the functions in a module, as markdown
+
+    python byte_code.py
+    python byte_code.py "../../solutions/week 3/code/core.py" --samples core_samples.py
+    python byte_code.py "../../solutions/week 3/code/core.py" --samples core_samples.py \
+        --diff stack_left core_samples.py:stack_left
+
+For every function a heading with its name, the source, the number of
+instructions and the disassembly are shown. Given sample inputs (a SAMPLES dictionary mapping
+function names to lists of argument tuples, in the module itself or in a
+--samples file) it also shows the time per call and how many times each
+line and each instruction of the function ran, to point at hot spots.
+--diff puts two implementations of a function side by side with the same
+numbers for each.
+"""
+import argparse
+import copy
+import dis
+import importlib
+import importlib.util
+import inspect
+import sys
+import timeit
+import types
+from collections import Counter
+from difflib import SequenceMatcher
+from itertools import zip_longest
+from pathlib import Path
+
+def load_module(name):
+    """import a module by name or from the path of a .py file"""
+    if not name.endswith('.py'):
+        return importlib.import_module(name)
+    path = Path(name).resolve()
+    # modules next to it, like core's bitboard, must be importable too
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[path.stem] = module
+    spec.loader.exec_module(module)
+    return module
+
+def load_function(spec, default):
+    """a function from 'name' in the default module or 'module:name'"""
+    module, _, name = spec.rpartition(':')
+    return getattr(load_module(module) if module else default, name)
+
+def functions(module):
+    """the functions defined in a module, in order of name"""
+    return [
+        (name, f) for name, f in inspect.getmembers(module, inspect.isfunction)
+        if f.__module__ == module.__name__
+    ]
+
+def fresh(samples, number):
+    """copies of the samples, so functions which change their arguments get the same input each call"""
+    return [copy.deepcopy(args) for _ in range(number) for args in samples]
+
+def per_call(function, samples, repeat=5, number=200):
+    """the best time in microseconds for one call, averaged over the samples"""
+    best = float('inf')
+    for _ in range(repeat):
+        calls = fresh(samples, number)
+        start = timeit.default_timer()
+        for args in calls:
+            function(*args)
+        best = min(best, timeit.default_timer() - start)
+    return best / len(calls) * 1_000_000
+
+def nested_codes(code):
+    """a code object and those of any lambdas or functions defined inside it"""
+    codes = {code}
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            codes |= nested_codes(const)
+    return codes
+
+def hotspots(function, samples):
+    """how many times each line ran, and how many instructions ran on it, over one call per sample"""
+    codes = nested_codes(function.__code__)
+    lines = Counter()
+    instructions = Counter()
+
+    def trace_line(frame, event, arg):
+        if event == 'line':
+            lines[frame.f_lineno] += 1
+        elif event == 'opcode':
+            instructions[frame.f_lineno] += 1
+        return trace_line
+
+    def trace_call(frame, event, arg):
+        if frame.f_code in codes:
+            frame.f_trace_opcodes = True
+            return trace_line
+        return None
+
+    calls = fresh(samples, 1)
+    sys.settrace(trace_call)
+    try:
+        for args in calls:
+            function(*args)
+    finally:
+        sys.settrace(None)
+    return lines, instructions
+
+def instruction_count(function):
+    return sum(len(list(dis.get_instructions(code))) for code in nested_codes(function.__code__))
+
+def source_block(function):
+    source = ''.join([str(l) for l in inspect.getsourcelines(function)[0]])
+    return f"```python\n{source}\n```"
+
+def dis_block(function):
+    lines = [f'```plaintext\n \tOPCODE\tOPNAME        \t\tARG\tARGVAL']
+    for op in dis.Bytecode(function):
+        lines.append(f'{op.offset}\t{op.opcode}\t{op.opname.ljust(20)}\t{op.arg}\t{op.argval}')
+    lines.append("```")
+    return '\n'.join(lines)
+
+def hotspot_table(function, samples):
+    lines, instructions = hotspots(function, samples)
+    total = sum(instructions.values())
+    source, first = inspect.getsourcelines(function)
+    rows = [
+        f'executed instructions per call: {total / len(samples):.1f}\n',
+        '| line | hits | instructions | share | source |',
+        '|-----:|-----:|-------------:|------:|--------|',
+    ]
+    for number, text in enumerate(source, first):
+        if lines[number] or instructions[number]:
+            code = text.strip().replace('|', '\\|')
+            rows.append(f'| {number} | {lines[number]} | {instructions[number]} | '
+                        f'{instructions[number] / total:.0%} | `{code}` |')
+    return '\n'.join(rows)
+
+def report(name, function, samples=None):
+    """the markdown for one function"""
+    parts = [f"## {name}", source_block(function), f"instructions: {instruction_count(function)}"]
+    if samples:
+        parts.append(f"per call: {per_call(function, samples):.3f} µs over {len(samples)} samples")
+        parts.append(hotspot_table(function, samples))
+    parts.append(dis_block(function))
+    return '\n\n'.join(parts)
+
+def short_instruction(op):
+    if isinstance(op.argval, types.CodeType):
+        return f'{op.opname} <code {op.argval.co_name}>'
+    return f'{op.opname} {op.argrepr}'.strip()
+
+def side_by_side(a, b, samples=None):
+    """the markdown comparing two implementations, with their instructions aligned"""
+    ops_a = [short_instruction(op) for op in dis.Bytecode(a)]
+    ops_b = [short_instruction(op) for op in dis.Bytecode(b)]
+    name_a = f'{a.__module__}.{a.__qualname__}'
+    name_b = f'{b.__module__}.{b.__qualname__}'
+    rows = [f'| | {name_a} | {name_b} |', '|-|-|-|']
+    rows.append(f'| instructions | {instruction_count(a)} | {instruction_count(b)} |')
+    if samples:
+        rows.append(f'| µs per call | {per_call(a, samples):.3f} | {per_call(b, samples):.3f} |')
+        executed = [sum(hotspots(f, samples)[1].values()) / len(samples) for f in (a, b)]
+        rows.append(f'| executed instructions per call | {executed[0]:.1f} | {executed[1]:.1f} |')
+    parts = [f"## {name_a} and {name_b}", source_block(a), source_block(b), '\n'.join(rows)]
+    lines = [f'```plaintext\n{name_a:<40}  {name_b}']
+    for tag, i1, i2, j1, j2 in SequenceMatcher(a=ops_a, b=ops_b, autojunk=False).get_opcodes():
+        mark = ' ' if tag == 'equal' else '|'
+        for left, right in zip_longest(ops_a[i1:i2], ops_b[j1:j2], fillvalue=''):
+            lines.append(f'{left:<40}{mark} {right}')
+    lines.append('```')
+    parts.append('\n'.join(lines))
+    return '\n\n'.join(parts)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report on the bytecode and cost of the functions in a module')
+    parser.add_argument('module', nargs='?', default='example_module', help='module name or path to a .py file')
+    parser.add_argument('--samples', help='module name or .py file with a SAMPLES dictionary')
+    parser.add_argument('--function', action='append', help='only report on these functions')
+    parser.add_argument('--diff', nargs=2, metavar=('A', 'B'),
+                        help="compare two functions, each a name in the module or 'module:name'")
+    args = parser.parse_args(argv)
+
+    module = load_module(args.module)
+    samples = getattr(module, 'SAMPLES', {})
+    if args.samples:
+        samples = {**samples, **load_module(args.samples).SAMPLES}
+
+    if args.diff:
+        a, b = (load_function(spec, module) for spec in args.diff)
+        print(side_by_side(a, b, samples.get(a.__name__) or samples.get(b.__name__)))
+        return
+    for name, f in functions(module):
+        if not args.function or name in args.function:
+            print(f"\n\n{report(name, f, samples.get(name))}")
+
+if __name__ == '__main__':
+    main()
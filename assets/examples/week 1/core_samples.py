@@ -0,0 +1,52 @@
+"""
+Sample inputs for profiling the 2048 core module with byte_code.py,
+and some alternative implementations to compare it with
+
+    python byte_code.py "../../solutions/week 3/code/core.py" --samples core_samples.py --function stack_left
+    python byte_code.py "../../solutions/week 3/code/core.py" --samples core_samples.py \
+        --diff merge_left core_samples.py:merge_left
+"""
+from random import Random
+
+def random_row(rng, size=4):
+    return [rng.choice([None, None, 2, 2, 4, 8]) for _ in range(size)]
+
+rng = Random(0)
+ROWS = [random_row(rng) for _ in range(50)]
+GRIDS = [[random_row(rng) for _ in range(4)] for _ in range(20)]
+
+SAMPLES = {
+    'stack_left': [(row,) for row in ROWS],
+    # merge_left is only ever given stacked rows
+    'merge_left': [([t for t in row if t] + [None] * row.count(None),) for row in ROWS],
+    'row_left': [(row,) for row in ROWS],
+    'row_right': [(row,) for row in ROWS],
+    'move_left': [(grid,) for grid in GRIDS],
+    'move_up': [(grid,) for grid in GRIDS],
+    'horizontal_points': [(grid,) for grid in GRIDS],
+    'vertical_points': [(grid,) for grid in GRIDS],
+    'is_game_over': [(grid,) for grid in GRIDS],
+}
+
+def stack_left(row):
+    """move the non-None items in one row to the left, without sorting"""
+    tiles = [tile for tile in row if tile]
+    return tiles + [None] * (len(row) - len(tiles))
+
+def merge_left(stacked_row):
+    """
+    Merge similar non-None items to the left, stopping at the first gap
+
+    The row must already be stacked, as row_left does before merging. Only
+    then does this give the same result as core.merge_left, because nothing
+    after the first gap is merged.
+    """
+    i = 0
+    last = len(stacked_row) - 1
+    while i < last and stacked_row[i + 1]:
+        if stacked_row[i] == stacked_row[i + 1]:
+            stacked_row[i] *= 2
+            stacked_row[i + 1] = None
+            i += 1
+        i += 1
+    return stacked_row
@@ -1,8 +1,15 @@
+import gc
 import html
+import io
 import sys
+from pathlib import Path
+
+# htmlbuilder lives with the markdown converter in week 2, the one copy of it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'week 2' / 'markdown'))
+import htmlbuilder
 
 def attr(**attributes):
-    return " ".join([f'{k.strip("_")}="{v}"' for k, v in attributes.items()]) or None
+    return htmlbuilder.attributes(**attributes).lstrip() or None
 
 def tag(tag, content=None, **attributes):
     a = attr(**attributes)
@@ -25,15 +32,22 @@ def py_object(arg):
     }
 
 
+# the table elements are compiled once and reused for every row
+TITLE = htmlbuilder.Element('th', colspan=2)
+TR = htmlbuilder.Element('tr')
+TH = htmlbuilder.Element('th')
+TD = htmlbuilder.Element('td')
+
 def to_table(arg):
     data = py_object(arg)
-    rows = [tag('th', "pyObject", colspan=2)]
+    out = io.StringIO()
+    out.write("<table>\n    ")
+    TR.write(out, TITLE("pyObject"))
     for key, value in data.items():
-        th = tag('th', key)
-        td = tag('td', html.escape(str(value)))
-        rows.append(f'{th}{td}')
-    result = "\n    ".join([tag('tr', row) for row in rows])
-    return f"<table>\n    {result}\n</table>"
+        out.write("\n    ")
+        TR.write(out, TH(key) + TD(html.escape(str(value))))
+    out.write("\n</table>")
+    return out.getvalue()
 
 def to_svg(variable, arg):
     data = py_object(arg)
@@ -41,6 +55,141 @@ def to_svg(variable, arg):
     return tag("svg", f"{v}", _class="pyObject", viewport="0 0 500 500")
 
 
+
+# Reporting on a whole graph of objects
+#
+# walk follows every reference from some root objects, visiting each object
+# once however many times it is referenced, so cycles are no problem. Rather
+# than a set of ids, the ids seen so far are kept as bits in pages of memory
+# addresses, which takes a few bytes per object rather than fifty or so.
+# The objects still to visit are kept as a stack of iterators, so only the
+# current path through the graph is held, not a list of everything waiting.
+
+class IdSet:
+    """A set of object ids stored as bits, one page of addresses at a time"""
+    PAGE_BITS = 16
+
+    def __init__(self):
+        self.pages = {}
+        self.count = 0
+
+    def add(self, address):
+        """add an id, returning False if it was already there"""
+        # objects are at least 8 byte aligned, so the low three bits are always 0
+        slot = address >> 3
+        page = self.pages.get(slot >> self.PAGE_BITS)
+        if page is None:
+            page = self.pages[slot >> self.PAGE_BITS] = bytearray(1 << (self.PAGE_BITS - 3))
+        offset = slot & ((1 << self.PAGE_BITS) - 1)
+        bit = 1 << (offset & 7)
+        if page[offset >> 3] & bit:
+            return False
+        page[offset >> 3] |= bit
+        self.count += 1
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return sum(len(page) for page in self.pages.values())
+
+
+# these are shared by the whole program, so they are counted but not followed
+NOT_FOLLOWED = (type, type(sys), type(py_object), type(print), type(py_object.__code__))
+# these never reference other objects, so there is nothing to follow
+ATOMS = {int, float, complex, bool, str, bytes, type(None)}
+
+def referents(obj):
+    """the objects directly referenced by obj"""
+    if isinstance(obj, dict):
+        # the garbage collector skips string keys, but they take memory too
+        for key, value in obj.items():
+            yield key
+            yield value
+    elif not isinstance(obj, NOT_FOLLOWED):
+        # every container, slot and instance attribute, including inherited slots
+        yield from gc.get_referents(obj)
+
+def walk(*roots):
+    """
+    yield (id, type name, size, refs) for every object reachable from the roots
+
+    refs is the reference count, less the reference walk holds itself.
+    """
+    seen = IdSet()
+    stack = [iter(roots)]
+    while stack:
+        obj = next(stack[-1], stack)
+        if obj is stack:
+            stack.pop()
+            continue
+        if not seen.add(id(obj)):
+            continue
+        yield id(obj), type(obj).__qualname__, sys.getsizeof(obj), sys.getrefcount(obj) - 2
+        if type(obj) not in ATOMS:
+            stack.append(referents(obj))
+        del obj
+
+def type_colour(name):
+    """a colour for a type, the same every time"""
+    return f'hsl({sum(name.encode()) * 47 % 360}, 60%, 60%)'
+
+ROW = htmlbuilder.Element('svg', _class='memory-row', width=1024, height=12)
+RECT = htmlbuilder.Element('rect', height=12)
+TOOLTIP = htmlbuilder.Element('title', escape=True)
+H1 = htmlbuilder.Element('h1', escape=True)
+NUMBER = htmlbuilder.Element('td', _class='number')
+
+def write_report(out, *roots, row_bytes=16384, max_cells=100_000, title='Memory map'):
+    """
+    write an html page mapping the memory used by everything reachable from the roots
+
+    Each object is a rectangle as wide as its size, laid out in rows of
+    row_bytes bytes in the order the objects are found. Rows are written as
+    they fill up, and only the first max_cells objects are drawn. A table of
+    the count and total size of each type follows the map. Returns the
+    per-type totals as {type name: [count, bytes]}.
+    """
+    scale = 1024 / row_bytes
+    out.write(f'<!doctype html>\n<html lang="en">\n<head><meta charset="utf-8"><title>{html.escape(title)}</title></head>\n<body>\n')
+    out.write(H1(title))
+    out.write('\n<div class="memory-map">\n')
+    types = {}
+    row = io.StringIO()
+    x = 0
+    cells = 0
+    for address, name, size, refs in walk(*roots):
+        totals = types.get(name)
+        if totals is None:
+            totals = types[name] = [0, 0]
+        totals[0] += 1
+        totals[1] += size
+        if cells == max_cells:
+            continue
+        cells += 1
+        width = size * scale
+        RECT.write(row, TOOLTIP(f'{name} at {address:#x}, {size} bytes, {refs} refs'),
+                   x=round(x, 2), width=round(width, 2), fill=type_colour(name))
+        x += width
+        if x >= 1024:
+            # an object larger than the rest of the row is cut off at the edge
+            out.write(ROW(row.getvalue()))
+            out.write('\n')
+            row = io.StringIO()
+            x = 0
+    if x:
+        out.write(ROW(row.getvalue()))
+        out.write('\n')
+    out.write('</div>\n<table>\n    ')
+    TR.write(out, TH('type') + TH('objects') + TH('bytes'))
+    for name, (count, size) in sorted(types.items(), key=lambda item: -item[1][1]):
+        out.write('\n    ')
+        TR.write(out, TD(html.escape(name)) + NUMBER(count) + NUMBER(size))
+    out.write('\n</table>\n</body>\n</html>\n')
+    return types
+
+
 # print(to_table(1))
 print(attr())
 print(attr(a=1))
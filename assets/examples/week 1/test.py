@@ -0,0 +1,70 @@
+"Tests for the object graph report in pyObject"
+
+import contextlib
+import io
+import unittest
+
+# pyObject prints some examples when it is imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import pyObject
+
+
+def names(*roots):
+    return [name for address, name, size, refs in pyObject.walk(*roots)]
+
+
+class Holder:
+    shared = [1, 2, 3]
+
+
+class TestIdSet(unittest.TestCase):
+
+    def test_add(self):
+        "An id is only added once"
+        ids = pyObject.IdSet()
+        self.assertTrue(ids.add(0x1000))
+        self.assertFalse(ids.add(0x1000))
+        self.assertTrue(ids.add(0x1008))
+        self.assertTrue(ids.add(0x7f0000001000))
+        self.assertEqual(len(ids), 3)
+
+
+class TestWalk(unittest.TestCase):
+
+    def test_cycle(self):
+        "A list containing itself is visited once"
+        cycle = []
+        cycle.append(cycle)
+        self.assertEqual(names(cycle), ['list'])
+
+    def test_shared(self):
+        "An object referenced twice is visited once"
+        inner = [1.5]
+        self.assertEqual(names([inner, inner]), ['list', 'list', 'float'])
+
+    def test_dict_keys(self):
+        "Dictionary keys are counted as well as values"
+        self.assertEqual(sorted(names({'key': 1.5})), ['dict', 'float', 'str'])
+
+    def test_not_followed(self):
+        "Classes and functions are counted but not looked inside"
+        self.assertEqual(names(Holder), ['type'])
+        self.assertEqual(names(names), ['function'])
+        self.assertEqual(names(Holder()), ['Holder', 'type'])
+
+
+class TestWriteReport(unittest.TestCase):
+
+    def test_max_cells(self):
+        "Only max_cells objects are drawn but every object is in the totals"
+        data = [[float(i)] for i in range(50)]
+        out = io.StringIO()
+        types = pyObject.write_report(out, data, max_cells=10)
+        self.assertEqual(out.getvalue().count('<rect'), 10)
+        self.assertEqual(types['list'][0], 51)
+        self.assertEqual(types['float'][0], 50)
+        self.assertEqual(sum(count for count, size in types.values()), len(names(data)))
+
+
+if __name__ == '__main__':
+    unittest.main()
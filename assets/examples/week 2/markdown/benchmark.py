@@ -0,0 +1,88 @@
+"""
+Measure how fast markdown.py converts a corpus of markdown files
+
+By default the corpus is the site's own lectures and exercises. Conversion
+is compared with plainly copying the same lines into an in-memory file, and
+the script exits with status 1 if converting is more than MAX_FACTOR times
+slower than copying.
+
+    python benchmark.py
+    python benchmark.py some/file.md another/file.md
+
+It also compares making elements with htmlbuilder against the f-string
+helper html_element used to be.
+"""
+import io
+import sys
+import time
+from pathlib import Path
+
+import htmlbuilder
+import markdown
+
+ROOT = Path(__file__).resolve().parents[4]
+CORPUS = sorted([*ROOT.glob('_lectures/*.md'), *ROOT.glob('_exercises/*.md')])
+
+# converting runs about 50 times slower than copying here, so this leaves room
+# for noise while catching a rule which makes the tokenizer much slower
+MAX_FACTOR = 75
+
+def copy(lines):
+    out = io.StringIO()
+    for line in lines:
+        out.write(line)
+    return out
+
+def convert(lines):
+    out = io.StringIO()
+    out.writelines(markdown.iter_html(lines))
+    return out
+
+def best_time(function, documents, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lines in documents:
+            function(lines)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def fstring_element(content, tag, **attr):
+    """html_element as it was before htmlbuilder, without any escaping"""
+    attrs = [f'{k.lstrip("_")}="{v}"' for k, v in attr.items()]
+    attrs = " ".join(attrs)
+    if attrs:
+        attrs = f" {attrs}"
+    return f"<{tag}{attrs}>{content}</{tag}>"
+
+def compare_helpers(count=20000):
+    """microseconds per element for the old helper, html_element and a compiled Element"""
+    texts = [f'paragraph {i}' for i in range(count)]
+    p = htmlbuilder.Element('p')
+    td = htmlbuilder.Element('td', _class='value')
+    cases = {
+        'p': (lambda t: fstring_element(t, 'p'), lambda t: markdown.html_element(t, 'p'), p),
+        'td class': (lambda t: fstring_element(t, 'td', _class='value'),
+                     lambda t: markdown.html_element(t, 'td', _class='value'), td),
+        'a href': (lambda t: fstring_element(t, 'a', href=t), lambda t: markdown.html_element(t, 'a', href=t),
+                   lambda t: markdown.LINK(t, href=t)),
+    }
+    for name, functions in cases.items():
+        times = [best_time(lambda ts: [f(t) for t in ts], [texts]) / count * 1_000_000 for f in functions]
+        print(f"{name:>9}: f-string {times[0]:.3f} µs, html_element {times[1]:.3f} µs, Element {times[2]:.3f} µs")
+
+def main(paths):
+    documents = [Path(p).read_text(encoding='utf-8').splitlines(keepends=True) for p in paths]
+    megabytes = sum(len(''.join(lines).encode()) for lines in documents) / 1_000_000
+    copying = best_time(copy, documents)
+    converting = best_time(convert, documents)
+    factor = converting / copying
+    print(f"{len(documents)} files, {megabytes:.2f} MB")
+    print(f"copy:    {megabytes / copying:10.1f} MB/s")
+    print(f"convert: {megabytes / converting:10.1f} MB/s")
+    print(f"convert is {factor:.1f}x slower than copying (limit {MAX_FACTOR}x)")
+    compare_helpers()
+    return 1 if factor > MAX_FACTOR else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:] or CORPUS))
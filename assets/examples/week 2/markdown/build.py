@@ -0,0 +1,175 @@
+"""
+Convert whole directories of markdown into html pages
+
+Each source directory is converted into a directory of the same name under
+the output directory, keeping the layout of the files inside it. Jekyll
+front matter is left out of the page and its title is used as the page
+title.
+
+A manifest in the output directory records the size, modification time and
+sha256 of every file converted. On the next build a file is only hashed if
+its size or modification time have changed, and only converted if its hash
+has changed, so a build where nothing has changed just looks at the files.
+Changed files are converted across a pool of processes. Changing markdown.py
+or htmlbuilder.py makes every file convert again.
+
+    python build.py ../../../../_lectures ../../../../_exercises --out site
+    python build.py ../../../../_weeks --out site --watch
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import htmlbuilder
+import markdown
+
+MANIFEST = '.manifest.json'
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# the output depends on the converter, and the html it builds, as well as the markdown
+CONVERTER = ':'.join(file_hash(Path(m.__file__)) for m in (markdown, htmlbuilder))
+
+def front_matter(lines):
+    """read any front matter from the start of a file's lines, returning its title"""
+    title = None
+    first = next(lines, None)
+    if first is None or first.rstrip() != '---':
+        return title, first
+    for line in lines:
+        if line.rstrip() == '---':
+            break
+        key, _, value = line.partition(':')
+        if key.strip() == 'title':
+            title = value.strip().strip('"\'')
+    return title, None
+
+def convert_file(job):
+    """convert one markdown file to an html page, returning its key in the manifest"""
+    key, source, target = job
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with source.open('r', encoding='utf-8') as md, target.open('w', encoding='utf-8') as out:
+        lines = iter(md)
+        title, first = front_matter(lines)
+        if first is not None:
+            lines = [first, *lines]
+        markdown.write_page(lines, out, title or source.stem)
+    return key
+
+def sources(directories):
+    """(key, path) for every markdown file in the directories, the key naming its output"""
+    for directory in directories:
+        directory = Path(directory)
+        for path in sorted(directory.rglob('*.md')):
+            yield f'{directory.name}/{path.relative_to(directory).as_posix()}', path
+
+def load_manifest(out):
+    try:
+        with (out / MANIFEST).open() as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get('converter') != CONVERTER:
+        return {}
+    return manifest['files']
+
+def save_manifest(out, files):
+    with (out / MANIFEST).open('w') as f:
+        json.dump({'converter': CONVERTER, 'files': files}, f, indent=1)
+
+def target_path(out, key):
+    return out / Path(key).with_suffix('.html')
+
+def build(directories, out, processes=None):
+    """
+    convert the markdown files which have changed since the last build
+
+    Returns the keys of the files converted and of the files removed because
+    their markdown has gone. Pages built earlier from directories not given
+    this time are left alone, so directories can be built separately into
+    the same output.
+    """
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    old = load_manifest(out)
+    directories = [Path(directory) for directory in directories]
+    names = {directory.name for directory in directories}
+    files = {}
+    jobs = []
+    for key, path in sources(directories):
+        stat = path.stat()
+        entry = old.get(key)
+        target = target_path(out, key)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            # the file looks the same, so trust the recorded hash
+            digest = entry['sha256']
+        else:
+            digest = file_hash(path)
+        files[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest}
+        if not entry or entry['sha256'] != digest or not target.exists():
+            jobs.append((key, path, target))
+
+    # only files from the directories in this build can have been removed,
+    # pages built from other directories into the same output are kept
+    removed = []
+    for key, entry in old.items():
+        if key in files:
+            continue
+        if key.split('/', 1)[0] in names:
+            removed.append(key)
+            target_path(out, key).unlink(missing_ok=True)
+        else:
+            files[key] = entry
+    removed.sort()
+
+    converted = []
+    if len(jobs) > 1 and processes != 1:
+        with Pool(processes) as pool:
+            converted = list(pool.imap_unordered(convert_file, jobs))
+    else:
+        converted = [convert_file(job) for job in jobs]
+    if converted or removed or files != old:
+        save_manifest(out, files)
+    return sorted(converted), removed
+
+def watch(directories, out, processes=None, interval=0.5):
+    """build again whenever a file changes, until interrupted"""
+    try:
+        while True:
+            converted, removed = build(directories, out, processes)
+            for key in converted:
+                print(f'converted {key}')
+            for key in removed:
+                print(f'removed {key}')
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert directories of markdown into html')
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('--out', default='site', help='directory for the html pages')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--watch', action='store_true', help='keep converting files as they change')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between checks when watching')
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        watch(args.directories, args.out, args.processes, args.interval)
+        return 0
+    start = time.perf_counter()
+    converted, removed = build(args.directories, args.out, args.processes)
+    print(f'{len(converted)} converted, {len(removed)} removed in {time.perf_counter() - start:.3f}s')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
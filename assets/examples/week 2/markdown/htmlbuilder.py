@@ -0,0 +1,71 @@
+"""
+htmlbuilder
+a small toolkit for building html elements quickly
+
+An Element compiles a tag and its fixed attributes into opening and closing
+strings once, so making each element afterwards is just joining three
+strings. Attribute values are always escaped, and content can be escaped
+too. Elements can be returned as strings or written straight to a file or
+io.StringIO.
+
+    P = Element('p')
+    LINK = Element('a', _class='external')
+    P(LINK('GAMR1520', href='https://example.com/?a=1&b=2'))
+"""
+import html
+
+def escape_attribute(value):
+    """a value made safe to put between double quotes"""
+    value = str(value)
+    if '&' in value or '"' in value or '<' in value or '>' in value:
+        return html.escape(value)
+    return value
+
+def attributes(**attrs):
+    """the attribute string for an opening tag, with a leading space"""
+    return ''.join([f' {k.strip("_")}="{escape_attribute(v)}"' for k, v in attrs.items()])
+
+class Element:
+    """A tag with fixed attributes, compiled once and used for any number of elements"""
+    __slots__ = ('tag', 'opening', 'closing', 'escape')
+
+    def __init__(self, tag, escape=False, void=False, **attrs):
+        self.tag = tag
+        self.opening = f'<{tag}{attributes(**attrs)}>'
+        self.closing = '' if void else f'</{tag}>'
+        self.escape = escape
+
+    def open(self, **attrs):
+        """the opening tag, with any extra attributes for this element only"""
+        if attrs:
+            return f'{self.opening[:-1]}{attributes(**attrs)}>'
+        return self.opening
+
+    def __call__(self, content='', **attrs):
+        if self.escape:
+            content = html.escape(content, quote=False)
+        if attrs:
+            return f'{self.opening[:-1]}{attributes(**attrs)}>{content}{self.closing}'
+        return f'{self.opening}{content}{self.closing}'
+
+    def write(self, out, content='', **attrs):
+        """write the element to an open file"""
+        if self.escape:
+            content = html.escape(content, quote=False)
+        out.write(self.open(**attrs) if attrs else self.opening)
+        out.write(content)
+        out.write(self.closing)
+
+_elements = {}
+
+def element(tag, escape=False, **attrs):
+    """the compiled Element for a tag and attributes, compiling it the first time"""
+    key = (tag, escape, *attrs.items())
+    try:
+        return _elements[key]
+    except KeyError:
+        compiled = _elements[key] = Element(tag, escape, **attrs)
+        return compiled
+    except TypeError:
+        # attribute values which can't be dictionary keys aren't cached
+        return Element(tag, escape, **attrs)
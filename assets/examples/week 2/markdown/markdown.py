@@ -1,25 +1,420 @@
-def html_element(content, tag, **attr):
-    attrs = [f'{k.lstrip("_")}="{v}"' for k, v in attr.items()]
-    attrs = " ".join(attrs)
-    if attrs:
-        attrs = f" {attrs}"
-    return f"<{tag}{attrs}>{content}</{tag}>"
+"""
+markdown
+a module for parsing markdown files and converting them to HTML
+
+Blocks (headings, paragraphs, lists, blockquotes and fenced code) are found
+in one pass over the lines, looking only at the first character of each line
+to decide what it might start. Inline markup (emphasis, links and code spans)
+is found in one pass over each block's text, jumping from one special
+character to the next. Elements come from htmlbuilder templates compiled
+once, which escape text and attribute values as they are filled in.
+"""
+import html
+import re
+
+import htmlbuilder
+
+# the elements used while converting, compiled once
+P = htmlbuilder.Element('p')
+HEADINGS = [None, *(htmlbuilder.Element(f'h{level}') for level in range(1, 7))]
+EM = htmlbuilder.Element('em')
+STRONG = htmlbuilder.Element('strong')
+LINK = htmlbuilder.Element('a')
+CODE = htmlbuilder.Element('code', escape=True)
+PRE = htmlbuilder.Element('pre')
+BLOCKQUOTE = htmlbuilder.Element('blockquote')
+LI = htmlbuilder.Element('li')
+UL = htmlbuilder.Element('ul')
+OL = htmlbuilder.Element('ol')
+
+# html_element templates, one for each tag and set of attribute names
+_templates = {}
+
+def html_element(content, tag, *, _escape=False, **attr):
+    """
+    an element as a string, the old helper kept for code that still uses it
+
+    The tag and attribute names are compiled into a template the first time
+    they are seen, so later calls only escape the attribute values and fill
+    it in. Escaping makes calls with attributes slower than the unescaped
+    f-string this used to be; compiled Elements are faster still. _escape
+    escapes the content too, with an underscore so that any attribute name,
+    escape included, can still be passed.
+    """
+    key = (tag, _escape, *attr)
+    template = _templates.get(key)
+    if template is None:
+        names = ''.join([f' {k.lstrip("_")}="{{}}"' for k in attr])
+        template = _templates[key] = f'<{tag}{names}>{{}}</{tag}>'.format
+    if _escape:
+        content = html.escape(content, quote=False)
+    if attr:
+        return template(*map(htmlbuilder.escape_attribute, attr.values()), content)
+    return template(content)
 
 def parse_md_file(path):
     with path.open('r') as f:
         return f.read().split('\n\n')
 
 def format_md_chunk(chunk):
-    tag = "p"
-    if chunk.startswith('# '):
-        chunk = chunk[2:]
-        tag = "h1"
-    return html_element(chunk, tag)
+    return '\n\n'.join(iter_blocks(chunk.split('\n')))
 
 def format_md_chunks(data):
     return [format_md_chunk(chunk) for chunk in data]
 
 def convert(path):
-    data = parse_md_file(path)
-    data = format_md_chunks(data)
-    return '\n\n'.join(data)
\ No newline at end of file
+    return ''.join(iter_convert(path))
+
+def iter_convert(path):
+    """yield the output of convert a piece at a time, so the whole document is never in memory"""
+    with path.open('r') as f:
+        yield from iter_html(f)
+
+def iter_html(lines):
+    """yield the html for an iterable of lines of markdown a piece at a time"""
+    separator = ''
+    for block in iter_blocks(line.rstrip('\n') for line in lines):
+        yield separator
+        yield block
+        separator = '\n\n'
+
+def write_html(path, out):
+    """write the output of convert to an open file as each block is converted"""
+    for piece in iter_convert(path):
+        out.write(piece)
+
+PAGE = """
+    <!doctype html>
+    <html lang="en">
+    <head>
+        <meta charset="utf-8">
+        <title>{title}</title>
+    </head>
+    <body>
+{body}
+    </body>
+    </html>
+    """
+
+def write_page(lines, out, title='Markdown converted output'):
+    """write a whole html page for some lines of markdown to an open file, streaming the body"""
+    head, tail = PAGE.split('{body}')
+    out.write(head.format(title=html.escape(title)))
+    out.writelines(iter_html(lines))
+    out.write(tail)
+
+
+# inline markup
+
+INLINE = re.compile(r'[\\\[\]`*_]')
+PUNCTUATION = set('!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~')
+
+def flanking(text, start, end):
+    """whether a run of * or _ can open and whether it can close emphasis"""
+    before = text[start - 1] if start else ' '
+    after = text[end] if end < len(text) else ' '
+    can_open = not after.isspace()
+    can_close = not before.isspace()
+    if text[start] == '_':
+        # snake_case_words are never emphasised
+        can_open = can_open and not before.isalnum()
+        can_close = can_close and not after.isalnum()
+    return can_open, can_close
+
+def code_span(text, start, end):
+    """the html and end position of a code span opened by the backticks at start, or None"""
+    run = text[start:end]
+    close = text.find(run, end)
+    while close != -1 and text[close + len(run):close + len(run) + 1] == '`':
+        close = text.find(run, close + len(run) + 1)
+    if close == -1:
+        return None
+    code = text[end:close].replace('\n', ' ')
+    if len(code) > 2 and code[0] == code[-1] == ' ' and code.strip():
+        code = code[1:-1]
+    return CODE(code), close + len(run)
+
+def link_target(text, start):
+    """the url, title and end position of a (url "title") at start, or None"""
+    if text[start:start + 1] != '(':
+        return None
+    close = text.find(')', start)
+    if close == -1:
+        return None
+    target = text[start + 1:close].strip()
+    url, _, title = target.partition(' ')
+    title = title.strip()
+    if title[:1] == title[-1:] and title[:1] in ('"', "'") and len(title) > 1:
+        title = title[1:-1]
+    elif title:
+        return None
+    return url.strip('<>'), title, close + 1
+
+def format_inline(text):
+    """the html for a block's text with emphasis, links and code spans"""
+    out = []
+    # [char, count, index into out] for each * _ or [ which might be closed later
+    openers = []
+    pos = 0
+    while True:
+        match = INLINE.search(text, pos)
+        if match is None:
+            out.append(html.escape(text[pos:], quote=False))
+            return ''.join(out)
+        start = end = match.start()
+        char = text[start]
+        # a run of backticks, stars or underscores is read as one token
+        end += 1
+        while char in '`*_' and text[end:end + 1] == char:
+            end += 1
+        if start > pos:
+            out.append(html.escape(text[pos:start], quote=False))
+        pos = end
+        if char == '\\':
+            following = text[end:end + 1]
+            if following and following in PUNCTUATION:
+                out.append(html.escape(following, quote=False))
+                pos = end + 1
+            else:
+                out.append('\\')
+        elif char == '`':
+            span = code_span(text, start, end)
+            if span:
+                code, pos = span
+                out.append(code)
+            else:
+                out.append(text[start:end])
+        elif char == '[':
+            out.append('[')
+            openers.append(['[', 1, len(out) - 1])
+        elif char == ']':
+            bracket = next((i for i in range(len(openers) - 1, -1, -1) if openers[i][0] == '['), None)
+            target = link_target(text, end) if bracket is not None else None
+            if target is None:
+                out.append(']')
+                if bracket is not None:
+                    del openers[bracket]
+                continue
+            url, title, pos = target
+            index = openers[bracket][2]
+            content = ''.join(out[index + 1:])
+            del out[index:]
+            # links can't contain other links, so earlier brackets are literal
+            openers = [o for o in openers[:bracket] if o[0] != '[']
+            if title:
+                out.append(LINK(content, href=url, title=title))
+            else:
+                out.append(LINK(content, href=url))
+        else:
+            can_open, can_close = flanking(text, start, end)
+            remaining = end - start
+            while remaining and can_close:
+                found = None
+                for i in range(len(openers) - 1, -1, -1):
+                    if openers[i][0] == '[':
+                        break
+                    if openers[i][0] == char:
+                        found = i
+                        break
+                if found is None:
+                    break
+                opener = openers[found]
+                used = 2 if remaining >= 2 and opener[1] >= 2 else 1
+                index = opener[2]
+                content = ''.join(out[index + 1:])
+                del out[index + 1:]
+                del openers[found + 1:]
+                opener[1] -= used
+                out[index] = char * opener[1]
+                if not opener[1]:
+                    openers.pop()
+                out.append((STRONG if used == 2 else EM)(content))
+                remaining -= used
+            if remaining:
+                out.append(char * remaining)
+                if can_open:
+                    openers.append([char, remaining, len(out) - 1])
+
+
+# blocks
+
+def heading(line):
+    """the level and text of an atx heading line, or None"""
+    level = len(line) - len(line.lstrip('#'))
+    if not 1 <= level <= 6 or (len(line) > level and line[level] not in ' \t'):
+        return None
+    text = line[level:].strip()
+    # closing hashes are optional and not part of the heading
+    stripped = text.rstrip('#')
+    if not stripped or stripped[-1] in ' \t':
+        text = stripped.rstrip()
+    return level, text
+
+def fence(line):
+    """the fence characters and info string opening a code block, or None"""
+    char = line[0]
+    length = len(line) - len(line.lstrip(char))
+    if length < 3:
+        return None
+    info = line[length:].strip()
+    if char == '`' and '`' in info:
+        return None
+    return line[:length], info.split(' ')[0]
+
+def list_marker(line):
+    """the type, start number and content of a list item line, or None"""
+    char = line[0]
+    if char in '-*+':
+        if line[1:2] in (' ', '\t'):
+            return char, None, line[2:]
+        if len(line) == 1:
+            return char, None, ''
+        return None
+    digits = len(line) - len(line.lstrip('0123456789'))
+    if not 0 < digits < 10 or line[digits:digits + 1] not in ('.', ')'):
+        return None
+    rest = line[digits + 1:]
+    if rest and rest[0] not in ' \t':
+        return None
+    return line[digits], int(line[:digits]), rest[1:]
+
+def list_html(start, items, loose):
+    """the html for a list from the lines of each of its items"""
+    lis = []
+    for lines in items:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        blocks = list(iter_blocks(lines, tight=not loose))
+        if loose:
+            lis.append(LI('\n' + '\n'.join(blocks) + '\n'))
+        else:
+            lis.append(LI('\n'.join(blocks)))
+    content = '\n' + '\n'.join(lis) + '\n'
+    if start is None:
+        return UL(content)
+    if start != 1:
+        return OL(content, start=start)
+    return OL(content)
+
+def iter_blocks(lines, tight=False):
+    """
+    yield the html for each block in an iterable of lines
+
+    Each line is looked at once. Lines belonging to a list or blockquote are
+    collected and converted with a recursive call when the block ends. In a
+    tight list paragraphs aren't wrapped in <p> tags.
+    """
+    paragraph = []
+    # the block being collected, one of None, 'fence', 'quote' or 'list'
+    state = None
+    collected = []
+    for line in lines:
+        if state == 'fence':
+            stripped = line.strip()
+            if stripped.startswith(opening) and not stripped.strip(opening[0]):
+                yield code_html(collected, info)
+                state = None
+            else:
+                collected.append(line)
+            continue
+        if state == 'quote':
+            content = line.lstrip(' ')
+            if content[:1] == '>':
+                content = content[1:]
+                collected.append(content[1:] if content[:1] == ' ' else content)
+                continue
+            yield BLOCKQUOTE('\n' + '\n\n'.join(iter_blocks(collected)) + '\n')
+            state = None
+        elif state == 'list':
+            content = line.lstrip(' ')
+            indent = len(line) - len(content)
+            if not content:
+                items[-1].append('')
+                blank = True
+                continue
+            if indent >= width:
+                if blank and items[-1][-1] == '' and len(items[-1]) > 1:
+                    loose = True
+                items[-1].append(line[width:])
+                blank = False
+                continue
+            item = list_marker(content) if indent < 4 else None
+            if item and item[0] == marker:
+                if blank:
+                    loose = True
+                items.append([item[2]])
+                width = len(line) - len(item[2])
+                blank = False
+                continue
+            if not blank and items[-1][-1].strip() and content[0] not in '#`~>' and not item:
+                # a lazy continuation of the last paragraph in the item
+                items[-1].append(content)
+                continue
+            yield list_html(number, items, loose)
+            state = None
+
+        content = line.lstrip(' ')
+        first = content[:1]
+        block = None
+        if len(line) - len(content) < 4:
+            if first == '#':
+                block = heading(content)
+                if block:
+                    kind = 'heading'
+            elif first in ('`', '~'):
+                block = fence(content)
+                if block:
+                    kind = 'fence'
+            elif first == '>':
+                block, kind = True, 'quote'
+            elif first in '-*+0123456789' and first:
+                block = list_marker(content)
+                # only a list starting at 1 can interrupt a paragraph
+                if block and paragraph and (block[1] not in (None, 1) or not block[2].strip()):
+                    block = None
+                if block:
+                    kind = 'list'
+        if not content or block:
+            if paragraph:
+                text = format_inline('\n'.join(paragraph))
+                yield text if tight else P(text)
+                paragraph = []
+        if not content:
+            continue
+        if block is None:
+            paragraph.append(content)
+        elif kind == 'heading':
+            level, text = block
+            yield HEADINGS[level](format_inline(text))
+        elif kind == 'fence':
+            opening, info = block
+            collected = []
+            state = 'fence'
+        elif kind == 'quote':
+            content = content[1:]
+            collected = [content[1:] if content[:1] == ' ' else content]
+            state = 'quote'
+        else:
+            marker, number, text = block
+            items = [[text]]
+            # continuation lines are indented to line up with the item's text
+            width = len(line) - len(text)
+            loose = blank = False
+            state = 'list'
+
+    if paragraph:
+        text = format_inline('\n'.join(paragraph))
+        yield text if tight else P(text)
+    if state == 'fence':
+        yield code_html(collected, info)
+    elif state == 'quote':
+        yield BLOCKQUOTE('\n' + '\n\n'.join(iter_blocks(collected)) + '\n')
+    elif state == 'list':
+        yield list_html(number, items, loose)
+
+def code_html(lines, info):
+    """the html for a fenced code block"""
+    code = ''.join(f'{line}\n' for line in lines)
+    if info:
+        return PRE(CODE(code, _class=f'language-{info}'))
+    return PRE(CODE(code))
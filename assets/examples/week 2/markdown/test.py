@@ -0,0 +1,250 @@
+"Tests for the markdown converter"
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import build
+import markdown
+
+
+def convert(text):
+    return ''.join(markdown.iter_html(text.split('\n')))
+
+
+class TestHeadings(unittest.TestCase):
+
+    def test_levels(self):
+        "One to six hashes make h1 to h6"
+        for level in range(1, 7):
+            self.assertEqual(convert(f"{'#' * level} title"), f"<h{level}>title</h{level}>")
+
+    def test_too_many(self):
+        "Seven hashes is a paragraph"
+        self.assertEqual(convert("####### title"), "<p>####### title</p>")
+
+    def test_separate_blocks(self):
+        "Headings on consecutive lines are separate blocks"
+        self.assertEqual(convert("# a\n## b"), "<h1>a</h1>\n\n<h2>b</h2>")
+
+
+class TestParagraphs(unittest.TestCase):
+
+    def test_lines_joined(self):
+        "Lines without a blank line between them are one paragraph"
+        self.assertEqual(convert("a\nb\n\nc"), "<p>a\nb</p>\n\n<p>c</p>")
+
+
+class TestLists(unittest.TestCase):
+
+    def test_tight(self):
+        "Items without blank lines between them aren't wrapped in paragraphs"
+        self.assertEqual(convert("- a\n- b"), "<ul>\n<li>a</li>\n<li>b</li>\n</ul>")
+
+    def test_loose(self):
+        "Items separated by blank lines are wrapped in paragraphs"
+        self.assertEqual(
+            convert("- a\n\n- b"),
+            "<ul>\n<li>\n<p>a</p>\n</li>\n<li>\n<p>b</p>\n</li>\n</ul>"
+        )
+
+    def test_nested(self):
+        "Indented items make a list inside the item above"
+        self.assertEqual(
+            convert("- a\n  - b\n  - c\n- d"),
+            "<ul>\n<li>a\n<ul>\n<li>b</li>\n<li>c</li>\n</ul></li>\n<li>d</li>\n</ul>"
+        )
+
+    def test_ordered(self):
+        "An ordered list starting at 1 has no start attribute"
+        self.assertEqual(convert("1. a\n2. b"), "<ol>\n<li>a</li>\n<li>b</li>\n</ol>")
+
+    def test_ordered_start(self):
+        "An ordered list starting at another number keeps it"
+        self.assertEqual(convert("3. a\n4. b"), '<ol start="3">\n<li>a</li>\n<li>b</li>\n</ol>')
+
+
+class TestBlockquotes(unittest.TestCase):
+
+    def test_paragraph(self):
+        "Quoted lines make a blockquote, ending at a blank line"
+        self.assertEqual(
+            convert("> quote\n> more\n\npara"),
+            "<blockquote>\n<p>quote\nmore</p>\n</blockquote>\n\n<p>para</p>"
+        )
+
+    def test_nested_blocks(self):
+        "A blockquote can hold other blocks"
+        self.assertEqual(
+            convert("> - a\n> - b"),
+            "<blockquote>\n<ul>\n<li>a</li>\n<li>b</li>\n</ul>\n</blockquote>"
+        )
+
+
+class TestCode(unittest.TestCase):
+
+    def test_fence_with_blank_lines(self):
+        "A fence keeps its blank lines and doesn't format its contents"
+        self.assertEqual(
+            convert("```python\nx = 1\n\n*y* = 2\n```"),
+            '<pre><code class="language-python">x = 1\n\n*y* = 2\n</code></pre>'
+        )
+
+    def test_fence_escaped(self):
+        "Code in a fence is escaped"
+        self.assertEqual(convert("```\na < b\n```"), "<pre><code>a &lt; b\n</code></pre>")
+
+    def test_span(self):
+        "Code spans are escaped and not formatted"
+        self.assertEqual(convert("a `*b* <c>` d"), "<p>a <code>*b* &lt;c&gt;</code> d</p>")
+
+    def test_span_with_backtick(self):
+        "A span opened with two backticks can hold one"
+        self.assertEqual(convert("`` a`b ``"), "<p><code>a`b</code></p>")
+
+
+class TestInline(unittest.TestCase):
+
+    def test_emphasis(self):
+        "One star or underscore is em and two are strong"
+        self.assertEqual(convert("*a* **b** _c_ __d__"),
+                         "<p><em>a</em> <strong>b</strong> <em>c</em> <strong>d</strong></p>")
+
+    def test_nested_emphasis(self):
+        "Emphasis can be nested either way round"
+        self.assertEqual(convert("*a **b** c*"), "<p><em>a <strong>b</strong> c</em></p>")
+        self.assertEqual(convert("**a *b* c**"), "<p><strong>a <em>b</em> c</strong></p>")
+
+    def test_link(self):
+        "A link becomes an a tag"
+        self.assertEqual(convert("[text](http://x.com)"), '<p><a href="http://x.com">text</a></p>')
+
+    def test_link_title(self):
+        "A link's title becomes its title attribute"
+        self.assertEqual(
+            convert('[text](http://x.com "A <title>")'),
+            '<p><a href="http://x.com" title="A &lt;title&gt;">text</a></p>'
+        )
+
+    def test_backslash_escapes(self):
+        "Escaped punctuation is shown as it is"
+        self.assertEqual(convert(r"\*not em\* \[not a link\]"), "<p>*not em* [not a link]</p>")
+
+    def test_html_escaped(self):
+        "Angle brackets and ampersands are escaped in text"
+        self.assertEqual(convert("a < b > c & d"), "<p>a &lt; b &gt; c &amp; d</p>")
+
+
+class TestHtmlElement(unittest.TestCase):
+
+    def test_attributes(self):
+        "Attribute values are escaped and a leading underscore is dropped"
+        self.assertEqual(markdown.html_element('x', 'a', href='?a=1&b="2"', _class='c'),
+                         '<a href="?a=1&amp;b=&quot;2&quot;" class="c">x</a>')
+
+    def test_template_reused(self):
+        "The same tag and attribute names with other values give their own element"
+        self.assertEqual(markdown.html_element('1', 'td', _class='a'), '<td class="a">1</td>')
+        self.assertEqual(markdown.html_element('{2}', 'td', _class='b'), '<td class="b">{2}</td>')
+
+    def test_attribute_names(self):
+        "Only leading underscores are dropped, and escape can be an attribute"
+        self.assertEqual(markdown.html_element('x', 'td', _class_='a', escape='b'),
+                         '<td class_="a" escape="b">x</td>')
+
+    def test_escape(self):
+        "Content is only escaped when asked"
+        self.assertEqual(markdown.html_element('<b>', 'p'), '<p><b></p>')
+        self.assertEqual(markdown.html_element('<b>', 'p', _escape=True), '<p>&lt;b&gt;</p>')
+
+
+class TestBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        root = Path(self.folder.name)
+        self.out = root / 'site'
+        self.lectures = root / 'lectures'
+        self.weeks = root / 'weeks'
+        for directory, names in [(self.lectures, ['a', 'b']), (self.weeks, ['w'])]:
+            (directory / 'sub').mkdir(parents=True)
+            for name in names:
+                (directory / 'sub' / f'{name}.md').write_text(f'# {name}\n')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def build(self, *directories):
+        return build.build(directories or [self.lectures], self.out, processes=1)
+
+    def test_first_build(self):
+        "Every file is converted the first time, keeping the directory layout"
+        converted, removed = self.build()
+        self.assertEqual(converted, ['lectures/sub/a.md', 'lectures/sub/b.md'])
+        self.assertEqual(removed, [])
+        self.assertIn('<h1>a</h1>', (self.out / 'lectures/sub/a.html').read_text())
+
+    def test_skip_unchanged(self):
+        "A build with nothing changed converts nothing"
+        self.build()
+        self.assertEqual(self.build(), ([], []))
+
+    def test_rebuild_changed(self):
+        "Only a file whose contents changed is converted again"
+        self.build()
+        (self.lectures / 'sub/a.md').write_text('# changed\n')
+        self.assertEqual(self.build(), (['lectures/sub/a.md'], []))
+        self.assertIn('changed', (self.out / 'lectures/sub/a.html').read_text())
+
+    def test_touched_not_rebuilt(self):
+        "A file with a new modification time but the same contents isn't converted"
+        self.build()
+        path = self.lectures / 'sub/a.md'
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.build(), ([], []))
+
+    def test_missing_page_rebuilt(self):
+        "A page deleted from the output is converted again"
+        self.build()
+        (self.out / 'lectures/sub/b.html').unlink()
+        self.assertEqual(self.build(), (['lectures/sub/b.md'], []))
+
+    def test_converter_changed(self):
+        "A different converter converts everything again"
+        self.build()
+        converter = build.CONVERTER
+        build.CONVERTER = 'something else'
+        try:
+            self.assertEqual(len(self.build()[0]), 2)
+        finally:
+            build.CONVERTER = converter
+
+    def test_removed(self):
+        "The page for a deleted markdown file is removed"
+        self.build()
+        (self.lectures / 'sub/b.md').unlink()
+        self.assertEqual(self.build(), ([], ['lectures/sub/b.md']))
+        self.assertFalse((self.out / 'lectures/sub/b.html').exists())
+
+    def test_separate_directories(self):
+        "Building another directory into the same output keeps the pages already there"
+        self.build(self.lectures)
+        self.assertEqual(self.build(self.weeks), (['weeks/sub/w.md'], []))
+        self.assertTrue((self.out / 'lectures/sub/a.html').exists())
+        self.assertEqual(self.build(self.lectures), ([], []))
+        self.assertEqual(self.build(self.lectures, self.weeks), ([], []))
+        (self.lectures / 'sub/a.md').unlink()
+        self.assertEqual(self.build(self.weeks), ([], []))
+        self.assertEqual(self.build(self.lectures), ([], ['lectures/sub/a.md']))
+
+    def test_pool(self):
+        "Converting across a pool of processes gives the same pages"
+        converted, removed = build.build([self.lectures], self.out, processes=2)
+        self.assertEqual(converted, ['lectures/sub/a.md', 'lectures/sub/b.md'])
+        self.assertIn('<h1>b</h1>', (self.out / 'lectures/sub/b.html').read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
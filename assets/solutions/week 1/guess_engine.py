@@ -0,0 +1,162 @@
+"""
+Strategies for guessing a secret number, and a benchmark to compare them
+
+A strategy is a function taking an oracle and the lowest and highest
+possible numbers, and returning the number it settles on. The oracle is a
+function which is given a guess and answers
+
+     0 if the guess is right
+     1 if the number is higher
+    -1 if the number is lower
+
+so the same strategies can play against a person, against guessing_game.py
+or against each other. Numbers can be any integers, up to 2 ** 63 and
+beyond. galloping also works without a highest number.
+
+An oracle can be noisy and sometimes give the wrong answer. The vote and
+lead wrappers ask each question several times so that any strategy can cope
+with that, at the cost of asking more questions.
+
+    python guess_engine.py --rounds 1000000
+    python guess_engine.py --rounds 100000 --high 9223372036854775807 --error 0.1
+"""
+import argparse
+import time
+from random import Random
+
+class Inconsistent(ValueError):
+    """raised when the answers leave no possible number"""
+
+
+def bisection(oracle, low, high):
+    """guess the middle of the possible numbers, halving them every time"""
+    while low <= high:
+        guess = (low + high) // 2
+        answer = oracle(guess)
+        if not answer:
+            return guess
+        if answer > 0:
+            low = guess + 1
+        else:
+            high = guess - 1
+    raise Inconsistent("No number fits the answers")
+
+def galloping(oracle, low=0, high=None):
+    """
+    guess low, low + 1, low + 3, low + 7... until the number is passed, then bisect
+
+    Finding a number n above low takes about 2 log2(n) questions, however
+    large high is, so high can be None for no limit at all.
+    """
+    step = 1
+    while high is None or low + step - 1 < high:
+        guess = low + step - 1
+        answer = oracle(guess)
+        if not answer:
+            return guess
+        if answer < 0:
+            return bisection(oracle, low + step // 2, guess - 1)
+        step *= 2
+    return bisection(oracle, low + step // 2, high)
+
+STRATEGIES = {
+    "bisection": bisection,
+    "galloping": galloping,
+}
+
+
+def exact(target):
+    """an oracle which always answers correctly"""
+    def oracle(guess):
+        return (guess < target) - (guess > target)
+    return oracle
+
+def noisy(target, error, rng=None):
+    """an oracle which gives one of the wrong answers with probability error"""
+    rng = rng or Random()
+    def oracle(guess):
+        answer = (guess < target) - (guess > target)
+        if rng.random() < error:
+            return rng.choice([a for a in (-1, 0, 1) if a != answer])
+        return answer
+    return oracle
+
+def vote(oracle, repeats=3):
+    """ask every question repeats times and take the most common answer"""
+    def majority(guess):
+        answers = [oracle(guess) for _ in range(repeats)]
+        return max((-1, 0, 1), key=answers.count)
+    return majority
+
+def lead(oracle, margin=2):
+    """ask every question until one answer has come up margin times more than any other"""
+    def leader(guess):
+        counts = {-1: 0, 0: 0, 1: 0}
+        while True:
+            answer = oracle(guess)
+            counts[answer] += 1
+            if counts[answer] - max(c for a, c in counts.items() if a != answer) >= margin:
+                return answer
+    return leader
+
+
+def play(strategy, oracle, low, high, wrapper=None):
+    """
+    the number a strategy settles on and how many questions it asked the oracle
+
+    wrapper, like vote or lead, goes between the strategy and the oracle, and
+    every question it asks is counted.
+    """
+    questions = 0
+    def counted(guess):
+        nonlocal questions
+        questions += 1
+        return oracle(guess)
+    try:
+        guess = strategy(wrapper(counted) if wrapper else counted, low, high)
+    except Inconsistent:
+        guess = None
+    return guess, questions
+
+
+def benchmark(strategy, rounds, low, high, error=0.0, wrapper=None, seed=0):
+    """play many rounds against random numbers, returning statistics about the questions asked"""
+    rng = Random(seed)
+    total = worst = wrong = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        target = rng.randint(low, high)
+        oracle = noisy(target, error, rng) if error else exact(target)
+        guess, questions = play(strategy, oracle, low, high, wrapper)
+        total += questions
+        worst = max(worst, questions)
+        wrong += guess != target
+    seconds = time.perf_counter() - start
+    return {
+        "rounds": rounds,
+        "mean": total / rounds,
+        "worst": worst,
+        "wrong": wrong,
+        "rounds_per_second": rounds / seconds,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare strategies for guessing a number")
+    parser.add_argument("--rounds", type=int, default=1_000_000)
+    parser.add_argument("--low", type=int, default=1)
+    parser.add_argument("--high", type=int, default=100)
+    parser.add_argument("--error", type=float, default=0.0, help="chance of each answer being wrong")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    wrappers = {"": None}
+    if args.error:
+        wrappers = {" + vote(5)": lambda o: vote(o, 5), " + lead(3)": lambda o: lead(o, 3)}
+    for name, strategy in STRATEGIES.items():
+        for suffix, wrapper in wrappers.items():
+            result = benchmark(strategy, args.rounds, args.low, args.high, args.error, wrapper, args.seed)
+            print(f"{name + suffix:>20}: mean {result['mean']:6.2f} worst {result['worst']:4d} "
+                  f"wrong {result['wrong']:7d} {result['rounds_per_second']:10,.0f} rounds/s")
+
+if __name__ == "__main__":
+    main()
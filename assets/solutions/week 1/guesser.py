@@ -1,24 +1,27 @@
 """A program which tries to guess the number that you are thinking of"""
 
+import guess_engine
+
 print("\n===================================")
 print("Think of a number between 1 and 100")
 print("Don't tell me".center(35))
 print("===================================")
 input("Press ENTER when you are ready.")
 
-possible_range = (1, 100)
 guesses = []
-while True:
-    guess = sum(possible_range) // 2
-    guesses.append(guess)
 
+# you are the oracle, answering each guess the strategy makes
+def ask(guess):
+    guesses.append(guess)
     if input(f"\nIs it {guess}?\n [y/n] >> ").lower().startswith("y"):
-        break
-
+        return 0
     if input(f"\nIs it greater than {guess}?\n [y/n] >> ").lower().startswith("y"):
-        possible_range = (guess + 1, possible_range[1])
-    else:
-        possible_range = (possible_range[0], guess - 1)
+        return 1
+    return -1
 
-print(f"\nI got it in {len(guesses)} guesses!\n")
-print(guesses)
\ No newline at end of file
+try:
+    guess_engine.bisection(ask, 1, 100)
+    print(f"\nI got it in {len(guesses)} guesses!\n")
+except guess_engine.Inconsistent:
+    print("\nYour answers don't add up to any number!\n")
+print(guesses)
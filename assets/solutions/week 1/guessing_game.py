@@ -1,7 +1,10 @@
 """A programme which generates a random integer and asks the user to guess it"""
 
+import sys
 from random import randint
 
+import guess_engine
+
 target = randint(1, 100)
 msg = "Guess the number"
 
@@ -11,14 +14,31 @@ print("Guessing game")
 print("=" * 20)
 print()
 
-while True:
-    guess = int(input(f"{msg}:\n[1-100] >> "))        
-    if guess == target:
-        break
+def answer(guess):
+    """0 if the guess is right, 1 if the number is higher and -1 if it is lower"""
+    global msg
     if guess < target:
         msg = f"\nIt's higher than {guess}"
-    else:
+        return 1
+    if guess > target:
         msg = f"\nIt's lower than {guess}"
+        return -1
+    return 0
+
+if len(sys.argv) > 1:
+    # name a strategy, like "python guessing_game.py bisection", to watch the computer play
+    strategy = guess_engine.STRATEGIES[sys.argv[1]]
+
+    def computer(guess):
+        print(f"{msg}:\n[1-100] >> {guess}")
+        return answer(guess)
+
+    strategy(computer, 1, 100)
+else:
+    while True:
+        guess = int(input(f"{msg}:\n[1-100] >> "))
+        if not answer(guess):
+            break
 
 print("Well done!")
-print(f"The number was {target}!")
\ No newline at end of file
+print(f"The number was {target}!")
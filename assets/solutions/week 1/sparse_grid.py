@@ -0,0 +1,83 @@
+"""
+Drawing part of a large grid kept as a {(x, y): value} dictionary
+
+The grid_v1 to grid_v4 examples look up every cell of the board. That is
+fine for noughts and crosses, but a board with millions of cells can't be
+drawn that way. RowIndex keeps a sorted list of the occupied columns in
+each row, so drawing a viewport only looks at the rows it shows and, with a
+binary search, only at the occupied cells inside it. Rows are produced one
+at a time, so drawing takes memory for one row of the viewport however big
+the board is.
+
+On a 3x3 board the whole viewport is drawn exactly as grid_v4.py draws it.
+"""
+from bisect import bisect_left, insort
+from itertools import islice
+
+vertical_line = "|"
+
+class RowIndex:
+    """The occupied cells of a {(x, y): value} grid, sorted by column within each row"""
+    def __init__(self, grid):
+        self.grid = grid
+        self.rows = {}
+        for x, y in grid:
+            self.rows.setdefault(y, []).append(x)
+        for columns in self.rows.values():
+            columns.sort()
+
+    def set(self, x, y, value):
+        """put a value in a cell, keeping the index up to date"""
+        if (x, y) not in self.grid:
+            insort(self.rows.setdefault(y, []), x)
+        self.grid[(x, y)] = value
+
+    def remove(self, x, y):
+        """empty a cell, keeping the index up to date"""
+        del self.grid[(x, y)]
+        columns = self.rows[y]
+        del columns[bisect_left(columns, x)]
+        if not columns:
+            del self.rows[y]
+
+    def row(self, y, left, width):
+        """one row of the viewport starting at column left, as text"""
+        cells = [' '] * width
+        columns = self.rows.get(y)
+        if columns:
+            start = bisect_left(columns, left)
+            end = bisect_left(columns, left + width, start)
+            for x in islice(columns, start, end):
+                cells[x - left] = self.grid[(x, y)]
+        return vertical_line.join([f" {value} " for value in cells])
+
+    def lines(self, left=0, top=0, width=3, height=3):
+        """yield the lines of a viewport, rows and the lines between them"""
+        horizontal_line = " ".join(["---"] * width)
+        for y in range(top, top + height):
+            if y > top:
+                yield horizontal_line
+            yield self.row(y, left, width)
+
+    def write(self, out, left=0, top=0, width=3, height=3):
+        """write a viewport to an open file, each line followed by a newline"""
+        for line in self.lines(left, top, width, height):
+            out.write(line)
+            out.write("\n")
+
+
+if __name__ == "__main__":
+    import sys
+    grid = {
+        (1, 1): "X",
+        (0, 1): "O",
+        (1, 2): "X",
+        (1, 0): "O",
+        (2, 2): "X",
+        (0, 0): "O",
+        (0, 2): "X",
+    }
+    # the same output as grid_v4.py
+    print()
+    RowIndex(grid).write(sys.stdout)
+    print()
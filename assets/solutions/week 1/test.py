@@ -0,0 +1,130 @@
+"Tests for the guessing engine and the sparse grid viewport"
+
+import contextlib
+import io
+import runpy
+import unittest
+from pathlib import Path
+from random import Random
+
+import guess_engine
+from guess_engine import Inconsistent, bisection, exact, galloping, lead, noisy, play, vote
+from sparse_grid import RowIndex
+
+HERE = Path(__file__).parent
+
+
+class TestOracles(unittest.TestCase):
+
+    def test_exact(self):
+        "1 means higher, -1 lower and 0 right"
+        oracle = exact(10)
+        self.assertEqual([oracle(5), oracle(10), oracle(15)], [1, 0, -1])
+
+    def test_noisy(self):
+        "With no error a noisy oracle is exact, and with certain error it is always wrong"
+        right = noisy(10, 0.0, Random(1))
+        wrong = noisy(10, 1.0, Random(1))
+        for guess in (5, 10, 15):
+            self.assertEqual(right(guess), exact(10)(guess))
+            for _ in range(20):
+                self.assertIn(wrong(guess), {-1, 0, 1} - {exact(10)(guess)})
+
+
+class TestStrategies(unittest.TestCase):
+
+    def test_bisection(self):
+        "Bisection finds every number in a range"
+        for target in range(1, 101):
+            self.assertEqual(bisection(exact(target), 1, 100), target)
+
+    def test_bisection_inconsistent(self):
+        "Answers that rule out every number raise Inconsistent"
+        with self.assertRaises(Inconsistent):
+            bisection(lambda guess: 1, 1, 100)
+
+    def test_galloping_no_limit(self):
+        "Galloping finds numbers with no highest number, however large"
+        for target in (0, 1, 7, 1000, 2 ** 63):
+            self.assertEqual(galloping(exact(target), 0, None), target)
+
+    def test_galloping_single_number(self):
+        "When low and high are the same that number is the answer"
+        self.assertEqual(galloping(exact(5), 5, 5), 5)
+
+    def test_galloping_questions(self):
+        "Galloping takes about 2 log2(n) questions for a number n"
+        guess, questions = play(galloping, exact(2 ** 63), 0, None)
+        self.assertEqual(guess, 2 ** 63)
+        self.assertLessEqual(questions, 2 * 64 + 2)
+
+
+class TestPlay(unittest.TestCase):
+
+    def test_counts_questions(self):
+        "Every question to the oracle is counted"
+        self.assertEqual(play(bisection, exact(50), 1, 100), (50, 1))
+
+    def test_counts_through_wrappers(self):
+        "Questions the wrappers ask are counted too"
+        self.assertEqual(play(bisection, exact(50), 1, 100, lambda o: vote(o, 5)), (50, 5))
+        self.assertEqual(play(bisection, exact(50), 1, 100, lambda o: lead(o, 3)), (50, 3))
+
+    def test_inconsistent(self):
+        "A game the strategy can't finish settles on None"
+        self.assertEqual(play(bisection, lambda guess: 1, 1, 3), (None, 2))
+
+    def test_wrappers_cope_with_noise(self):
+        "Voting gets most answers right from a noisy oracle"
+        result = guess_engine.benchmark(bisection, 200, 1, 100, error=0.1,
+                                        wrapper=lambda o: vote(o, 5), seed=1)
+        self.assertLess(result["wrong"], 20)
+
+
+class TestRowIndex(unittest.TestCase):
+
+    def lines(self, index, *viewport):
+        out = io.StringIO()
+        index.write(out, *viewport)
+        return out.getvalue().split("\n")[:-1]
+
+    def test_same_as_grid_v4(self):
+        "The 3x3 example is drawn byte for byte as grid_v4.py draws it"
+        outputs = []
+        for name in ("grid_v4.py", "sparse_grid.py"):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                namespace = runpy.run_path(str(HERE / name), run_name="__main__")
+            outputs.append(out.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+        out = io.StringIO()
+        RowIndex(dict(namespace["grid"])).write(out)
+        self.assertEqual(f"\n{out.getvalue()}\n", outputs[0])
+
+    def test_clipping(self):
+        "Only cells inside the viewport are drawn"
+        index = RowIndex({(0, 0): "a", (5, 0): "b", (6, 1): "c", (9, 9): "d"})
+        self.assertEqual(self.lines(index, 4, 0, 3, 2),
+                         ["   | b |   ", "--- --- ---", "   |   | c "])
+
+    def test_empty_rows(self):
+        "Rows with nothing in them, or outside the grid, are drawn empty"
+        index = RowIndex({})
+        self.assertEqual(self.lines(index, -2, -2, 2, 1), ["   |   "])
+
+    def test_set_and_remove(self):
+        "Setting and removing cells keeps the sorted index up to date"
+        index = RowIndex({(3, 0): "a"})
+        index.set(1, 0, "b")
+        index.set(3, 0, "c")
+        index.set(2, 4, "d")
+        self.assertEqual(index.rows, {0: [1, 3], 4: [2]})
+        self.assertEqual(self.lines(index, 0, 0, 4, 1), ["   | b |   | c "])
+        index.remove(2, 4)
+        index.remove(1, 0)
+        self.assertEqual(index.rows, {0: [3]})
+        self.assertEqual(index.grid, {(3, 0): "c"})
+
+
+if __name__ == '__main__':
+    unittest.main()
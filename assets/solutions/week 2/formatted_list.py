@@ -1,9 +1,47 @@
-def formatted_list(items, title="list", border='*', padding=2):
-    width = max([len(i) for i in items + [title]]) + padding * 2
+def formatted_lines(items, title="list", border='*', padding=2, width=None):
+    """
+    yield the lines of a formatted list one at a time
+
+    items can be any iterable, including an open file. Without a width the
+    longest item is found first, so items must be something that can be read
+    twice, like a list or a file that can seek back to where it started.
+    """
+    if width is None:
+        width = max(longest(items), len(title)) + padding * 2
     hline = border * width
-    result = [hline, title, hline] + items + [hline]
-    result = [f"{border}{i.center(width)}{border}" for i in result]
-    return "\n".join(result)
+    for line in (hline, title, hline):
+        yield f"{border}{line.center(width)}{border}"
+    for item in lines(items):
+        yield f"{border}{item.center(width)}{border}"
+    yield f"{border}{hline.center(width)}{border}"
+
+def lines(items):
+    """the items, without line endings if they come from a file"""
+    if hasattr(items, 'readline'):
+        return (line.rstrip('\n') for line in items)
+    return items
+
+def longest(items):
+    """the length of the longest item, reading the items without using them up"""
+    if hasattr(items, 'seekable') and items.seekable():
+        start = items.tell()
+        result = max((len(i) for i in lines(items)), default=0)
+        items.seek(start)
+        return result
+    if iter(items) is items:
+        raise TypeError("items can only be read once, so a width is needed")
+    return max((len(i) for i in items), default=0)
+
+def write_formatted_list(out, items, title="list", border='*', padding=2, width=None):
+    """write a formatted list to an open file a line at a time"""
+    separator = ""
+    for line in formatted_lines(items, title, border, padding, width):
+        out.write(separator)
+        out.write(line)
+        separator = "\n"
+
+def formatted_list(items, title="list", border='*', padding=2):
+    return "\n".join(formatted_lines(items, title, border, padding))
 
 items = ["apples", "bananas", "cherries"]
-print(formatted_list(items, title="fruit", border="+", padding=10))
\ No newline at end of file
+print(formatted_list(items, title="fruit", border="+", padding=10))
@@ -0,0 +1,167 @@
+"""
+A list of lines kept on disk, saved as each item is added
+
+The list lives in two files. The snapshot (shopping.txt) has one item per
+line, exactly as shopping_list.py always wrote it. The journal
+(shopping.txt.journal) has the items added since the snapshot was last
+brought up to date. Every new item is appended to the journal and flushed
+straight away, so nothing is lost if the program stops.
+
+Once the journal passes a size threshold it is compacted in a background
+thread by appending it to the end of the snapshot, so compacting costs the
+size of the journal, not of the whole list. While this happens the journal
+is renamed to record the size the snapshot had before, so if the program
+stops part way through the next open can tell whether the journal still
+needs adding.
+
+Opening a list only reads the journal, which is compacted each time it
+passes the threshold. Items added while a compaction is still running go to
+the new journal, so adding very quickly can take it past the threshold
+until the next compaction. The snapshot is mapped into memory with mmap and only read when
+the items are, so a list of ten million items opens as fast as one of ten.
+"""
+import mmap
+import os
+import threading
+from pathlib import Path
+
+CHUNK = 1 << 20
+
+class JournaledList:
+    """The items in a snapshot file and its journal, added to by appending"""
+
+    def __init__(self, path, threshold=65536, durable=False):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + '.journal')
+        self.threshold = threshold
+        # with durable=True every item is synced to the disk, not just to the operating system
+        self.durable = durable
+        self.lock = threading.Lock()
+        self.compactor = None
+        self.compacting = []
+        self.path.touch()
+        self.recover()
+        with self.path.open('r+b') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # a list saved by hand may not end with a newline
+                    f.write(b'\n')
+        self.snapshot = None
+        self.map_snapshot()
+        with self.journal_path.open('a+b') as f:
+            f.seek(0)
+            self.pending = f.read().decode().splitlines()
+        self.journal = self.journal_path.open('ab')
+
+    def compacting_path(self, size):
+        return self.journal_path.with_name(f'{self.journal_path.name}.{size}')
+
+    def recover(self):
+        """finish any compaction that was interrupted"""
+        for leftover in self.path.parent.glob(f'{self.journal_path.name}.*'):
+            # other files, like a backup someone made of the journal, are left alone
+            if not leftover.suffix[1:].isdecimal():
+                continue
+            size = int(leftover.suffix[1:])
+            data = leftover.read_bytes()
+            if os.path.getsize(self.path) != size + len(data):
+                # the snapshot may have some of the journal, so start again from before it
+                with self.path.open('r+b') as f:
+                    f.truncate(size)
+                    f.seek(size)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            leftover.unlink()
+
+    def map_snapshot(self):
+        # an old map is left for the garbage collector to close, as it may still be being read
+        self.snapshot = None
+        with self.path.open('rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self.snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def snapshot_items(snapshot):
+        if snapshot is None:
+            return
+        start = 0
+        end = len(snapshot)
+        while start < end:
+            newline = snapshot.find(b'\n', start)
+            if newline == -1:
+                newline = end
+            yield snapshot[start:newline].decode()
+            start = newline + 1
+
+    def __iter__(self):
+        with self.lock:
+            snapshot = self.snapshot_items(self.snapshot)
+            later = self.compacting + self.pending
+        yield from snapshot
+        yield from later
+
+    def __len__(self):
+        with self.lock:
+            snapshot = self.snapshot
+            count = len(self.compacting) + len(self.pending)
+        if snapshot is not None:
+            # counted a piece at a time so the snapshot is never copied whole
+            count += sum(snapshot[i:i + CHUNK].count(b'\n') for i in range(0, len(snapshot), CHUNK))
+        return count
+
+    def add(self, item):
+        """add an item, saving it to the journal before returning"""
+        with self.lock:
+            self.journal.write(f'{item}\n'.encode())
+            self.journal.flush()
+            if self.durable:
+                os.fsync(self.journal.fileno())
+            self.pending.append(item)
+            if self.journal.tell() >= self.threshold and self.compactor is None:
+                self.start_compaction()
+
+    def __iadd__(self, items):
+        for item in items:
+            self.add(item)
+        return self
+
+    def start_compaction(self):
+        """swap in a new journal and add the old one to the snapshot in the background"""
+        self.journal.close()
+        compacting = self.compacting_path(os.path.getsize(self.path))
+        os.replace(self.journal_path, compacting)
+        self.journal = self.journal_path.open('ab')
+        self.compacting = self.pending
+        self.pending = []
+        self.compactor = threading.Thread(target=self.compact, args=(compacting,))
+        self.compactor.start()
+
+    def compact(self, compacting):
+        data = compacting.read_bytes()
+        with self.path.open('ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        compacting.unlink()
+        with self.lock:
+            self.map_snapshot()
+            self.compacting = []
+            self.compactor = None
+
+    def close(self):
+        """wait for any compaction to finish and close the files"""
+        compactor = self.compactor
+        if compactor is not None:
+            compactor.join()
+        self.journal.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
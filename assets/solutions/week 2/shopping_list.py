@@ -1,10 +1,11 @@
 from pathlib import Path
 
+from journal import JournaledList
+
 path = Path("./shopping.txt")
 
-# read data from file
-with path.open("r") as f:
-    shopping = f.read().splitlines()
+# items are saved to a journal as they are added, so the file is never rewritten
+shopping = JournaledList(path)
 
 width = 20
 hline = '=' * width
@@ -18,9 +19,6 @@ while True:
     keep_going = input("add an item to the list? [y/n]")
     if not keep_going.lower().startswith('y'):
         break
-    shopping += (input("New item: "),)
+    shopping.add(input("New item: "))
 
-# write data back to file
-with path.open("w") as f:
-    for line in shopping:
-        f.write(f"{line}\n")
+shopping.close()
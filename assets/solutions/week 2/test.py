@@ -0,0 +1,116 @@
+"Tests for the journaled shopping list and formatted_list"
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from journal import JournaledList
+
+# formatted_list prints an example when it is imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import formatted_list
+
+
+class TestJournaledList(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "shopping.txt"
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def items(self):
+        with JournaledList(self.path) as shopping:
+            return list(shopping), len(shopping)
+
+    def interrupted(self, appended):
+        """
+        leave the files as a compaction stopped part way through would
+
+        The snapshot has a and b, the journal being compacted has c and d, of
+        which appended bytes had reached the snapshot, and e was added to
+        the new journal afterwards.
+        """
+        self.path.write_bytes(b"a\nb\n" + b"c\nd\n"[:appended])
+        Path(f"{self.path}.journal.4").write_bytes(b"c\nd\n")
+        Path(f"{self.path}.journal").write_bytes(b"e\n")
+
+    def check_recovered(self):
+        self.assertEqual(self.items(), (["a", "b", "c", "d", "e"], 5))
+        self.assertEqual(self.path.read_bytes(), b"a\nb\nc\nd\n")
+        self.assertFalse(Path(f"{self.path}.journal.4").exists())
+
+    def test_interrupted_before_append(self):
+        "A compaction that hadn't written anything is finished on the next open"
+        self.interrupted(0)
+        self.check_recovered()
+
+    def test_interrupted_during_append(self):
+        "A compaction that had written part of the journal is redone from the start"
+        self.interrupted(3)
+        self.check_recovered()
+
+    def test_interrupted_after_append(self):
+        "A compaction that had written everything only has its file removed"
+        self.interrupted(4)
+        self.check_recovered()
+
+    def test_other_files_ignored(self):
+        "A file that isn't a compacting journal, like a backup, is left alone"
+        self.path.write_bytes(b"a\n")
+        backup = Path(f"{self.path}.journal.bak")
+        backup.write_bytes(b"x\n")
+        self.assertEqual(self.items(), (["a"], 1))
+        self.assertTrue(backup.exists())
+
+    def test_compaction(self):
+        "Items stay in order and are all kept across background compactions"
+        items = [f"item {i}" for i in range(500)]
+        with JournaledList(self.path, threshold=64) as shopping:
+            for item in items:
+                shopping.add(item)
+            self.assertEqual(list(shopping), items)
+        self.assertEqual(self.items(), (items, 500))
+        # at least the first journal was compacted into the snapshot
+        self.assertTrue(self.path.read_text().startswith("item 0\nitem 1\n"))
+
+    def test_no_trailing_newline(self):
+        "A list saved without a final newline keeps its last item separate"
+        self.path.write_bytes(b"a\nb")
+        with JournaledList(self.path) as shopping:
+            shopping.add("c")
+        self.assertEqual(self.items(), (["a", "b", "c"], 3))
+
+
+class TestFormattedList(unittest.TestCase):
+
+    def test_same_as_before(self):
+        "A list is formatted as one string the same as it always was"
+        self.assertEqual(
+            formatted_list.formatted_list(["ab", "c"], title="t", padding=1),
+            "******\n* t  *\n******\n* ab *\n* c  *\n******"
+        )
+
+    def test_file_read_twice(self):
+        "A file that can seek is read once for the width and again for the lines"
+        items = io.StringIO("apples\npears\n")
+        lines = list(formatted_list.formatted_lines(items))
+        self.assertEqual(lines[3:5], ["*  apples  *", "*  pears   *"])
+
+    def test_pipe_needs_width(self):
+        "A pipe can't seek, so without a width it raises TypeError"
+        read, write = os.pipe()
+        os.write(write, b"apples\n")
+        os.close(write)
+        with open(read) as items:
+            self.assertRaises(TypeError, list, formatted_list.formatted_lines(items))
+            with open(os.devnull, "w") as out:
+                formatted_list.write_formatted_list(out, items, width=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
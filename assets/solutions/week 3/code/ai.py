@@ -0,0 +1,179 @@
+"""
+An expectimax player for 2048
+
+The solver works on packed boards from bitboard.py. A search alternates
+between our move, where the best direction is taken, and the game's move,
+where a new tile appears in a random empty cell. New tiles are weighted the
+same way as spawn.NEW_TILES, so a 2 appears with probability 0.75 and a 4
+with probability 0.25.
+
+The search deepens one move at a time until the time budget runs out and the
+best move from the deepest completed search is used. Board values are kept in
+a bounded transposition table so positions reached by different routes are
+only evaluated once.
+"""
+import time
+from collections import OrderedDict
+
+import bitboard
+import core
+import spawn
+
+MOVES = {
+    "up": bitboard.move_up,
+    "left": bitboard.move_left,
+    "down": bitboard.move_down,
+    "right": bitboard.move_right,
+}
+
+# (exponent, probability) for each possible new tile
+SPAWNS = [
+    (value.bit_length() - 1, spawn.NEW_TILES.count(value) / len(spawn.NEW_TILES))
+    for value in sorted(set(spawn.NEW_TILES))
+]
+
+
+class OutOfTime(Exception):
+    """raised inside a search when the time budget is used up"""
+
+
+def row_score(row):
+    """a score for a single 16-bit row, favouring gaps, merges and order"""
+    exponents = bitboard.unpack_row(row)
+    empty = exponents.count(0)
+    merges = 0
+    previous = 0
+    for e in exponents:
+        if e:
+            if e == previous:
+                merges += 1
+            previous = e
+    left = right = 0
+    for a, b in zip(exponents, exponents[1:]):
+        if a > b:
+            left += a ** 4 - b ** 4
+        else:
+            right += b ** 4 - a ** 4
+    return 200000 + 270 * empty + 700 * merges - 47 * min(left, right)
+
+
+_row_scores = None
+
+
+def row_heuristic(board):
+    """the default heuristic, summing row_score over every row and column"""
+    global _row_scores
+    if _row_scores is None:
+        _row_scores = [row_score(row) for row in range(bitboard.ROW_COUNT)]
+    scores = _row_scores
+    total = 0
+    for b in (board, bitboard.transpose(board)):
+        total += (
+            scores[b & 0xFFFF] + scores[(b >> 16) & 0xFFFF] +
+            scores[(b >> 32) & 0xFFFF] + scores[(b >> 48) & 0xFFFF]
+        )
+    return total
+
+
+class Solver:
+    """
+    Choose moves by expectimax search
+
+    heuristic is any function taking a packed board and returning a number,
+    bigger is better. budget_ms is the time allowed for each move and
+    table_size bounds the number of positions kept in the transposition table.
+    """
+    def __init__(self, heuristic=row_heuristic, budget_ms=100, table_size=200_000,
+                 max_depth=8, min_probability=0.0001):
+        self.heuristic = heuristic
+        self.budget_ms = budget_ms
+        self.table_size = table_size
+        self.max_depth = max_depth
+        self.min_probability = min_probability
+        self.table = OrderedDict()
+        self.nodes = 0
+        self.depth = 0
+        self.elapsed = 0.0
+
+    @property
+    def nodes_per_second(self):
+        """search speed during the last call to best_move"""
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def best_move(self, grid):
+        """
+        the best direction ("up", "left", "down" or "right") for a grid, or None
+
+        A grid with a tile above 32768 can't be packed into a board, so it
+        gets the first legal move without any search.
+        """
+        try:
+            board = bitboard.from_grid(grid)
+        except ValueError:
+            self.nodes = self.depth = 0
+            self.elapsed = 0.0
+            legal = core.legal_moves(grid)
+            return next((d for d in MOVES if d in legal), None)
+        return self.best_board_move(board)
+
+    def best_board_move(self, board):
+        """the best direction for a packed board, or None if no move is possible"""
+        start = time.perf_counter()
+        self.deadline = start + self.budget_ms / 1000
+        self.nodes = 0
+        self.depth = 0
+        possible = bitboard.legal_moves(board)
+        legal = [d for d in MOVES if d in possible]
+        best = legal[0] if legal else None
+        try:
+            for depth in range(1, self.max_depth + 1):
+                if len(legal) < 2:
+                    break
+                best = self.search_root(board, legal, depth)
+                self.depth = depth
+        except OutOfTime:
+            pass
+        self.elapsed = time.perf_counter() - start
+        return best
+
+    def search_root(self, board, legal, depth):
+        """the best of the legal moves when searching to the given depth"""
+        values = {
+            direction: self.chance_value(MOVES[direction](board), depth, 1.0)
+            for direction in legal
+        }
+        return max(values, key=values.get)
+
+    def max_value(self, board, depth, probability):
+        """the value of a board when it is our turn to move"""
+        self.nodes += 1
+        if not self.nodes & 0xFF and time.perf_counter() > self.deadline:
+            raise OutOfTime()
+        if depth == 0 or probability < self.min_probability:
+            return self.heuristic(board)
+        best = None
+        for move in MOVES.values():
+            moved = move(board)
+            if moved != board:
+                value = self.chance_value(moved, depth, probability)
+                if best is None or value > best:
+                    best = value
+        return best if best is not None else 0
+
+    def chance_value(self, board, depth, probability):
+        """the expected value of a board over every possible new tile"""
+        cached = self.table.get(board)
+        if cached is not None and cached[0] >= depth:
+            self.table.move_to_end(board)
+            return cached[1]
+        cells = spawn.empty_shifts(board)
+        total = 0.0
+        for shift in cells:
+            for exponent, chance in SPAWNS:
+                p = probability * chance / len(cells)
+                total += chance * self.max_value(board | exponent << shift, depth - 1, p)
+        value = total / len(cells) if cells else self.heuristic(board)
+        self.table[board] = (depth, value)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+        return value
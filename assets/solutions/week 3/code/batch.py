@@ -0,0 +1,136 @@
+"""
+Apply 2048 moves to many boards at once with NumPy
+
+Boards can be given either as an (N, 4, 4) array of tile values, with 0 for
+an empty cell, or as an (N,) array of packed uint64 boards in the layout used
+by bitboard.py. Every operation works on the packed form using the same row
+tables as bitboard, so a batch move is a handful of array lookups whatever
+the size of the batch.
+"""
+import numpy as np
+
+import bitboard
+
+LEFT, RIGHT, UP, DOWN = 0, 1, 2, 3
+
+ROW_MASK = np.uint64(bitboard.ROW_MASK)
+SHIFTS = [np.uint64(16 * r) for r in range(4)]
+
+_tables = None
+
+
+def get_tables():
+    """the bitboard row tables as NumPy arrays"""
+    global _tables
+    if _tables is None:
+        tables = bitboard.get_tables()
+        _tables = bitboard.RowTables(
+            np.array(tables.left, dtype=np.uint64),
+            np.array(tables.right, dtype=np.uint64),
+            np.array(tables.points, dtype=np.int64),
+            np.array(tables.changed, dtype=np.uint8),
+        )
+    return _tables
+
+
+def pack(grids):
+    """convert an (N, 4, 4) array of tile values into an (N,) array of boards"""
+    grids = np.asarray(grids, dtype=np.int64)
+    if grids.ndim != 3 or grids.shape[1:] != (4, 4):
+        raise ValueError(f"Expected an (N, 4, 4) array, got shape {grids.shape}")
+    exponents = np.zeros(grids.shape, dtype=np.int64)
+    occupied = grids > 0
+    exponents[occupied] = np.log2(grids[occupied]).round().astype(np.int64)
+    valid = (grids == np.where(occupied, 1 << exponents, 0))
+    if not valid.all() or exponents.max(initial=0) > bitboard.MAX_EXPONENT:
+        bad = grids[~valid | (exponents > bitboard.MAX_EXPONENT)]
+        raise ValueError(f"Cannot pack tile value {bad[0]!r}")
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    cells = exponents.reshape(len(grids), 16).astype(np.uint64)
+    return np.bitwise_or.reduce(cells << shifts, axis=1)
+
+
+def unpack(boards):
+    """convert an (N,) array of boards into an (N, 4, 4) array of tile values"""
+    boards = np.asarray(boards, dtype=np.uint64)
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    exponents = ((boards[:, None] >> shifts) & np.uint64(0xF)).astype(np.int64)
+    values = np.where(exponents > 0, 1 << exponents, 0)
+    return values.reshape(len(boards), 4, 4)
+
+
+def transpose(boards):
+    """flip every board diagonally"""
+    a1 = boards & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = boards & np.uint64(0x0000F0F00000F0F0)
+    a3 = boards & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << np.uint64(12)) | (a3 >> np.uint64(12))
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> np.uint64(24)) | (b3 << np.uint64(24))
+
+
+def _move_rows(boards, right):
+    """move every row left, or right where the right mask is set"""
+    tables = get_tables()
+    result = np.zeros_like(boards)
+    points = np.zeros(len(boards), dtype=np.int64)
+    for shift in SHIFTS:
+        rows = (boards >> shift) & ROW_MASK
+        moved = np.where(right, tables.right[rows], tables.left[rows])
+        result |= moved << shift
+        points += tables.points[rows]
+    return result, points
+
+
+def move(boards, directions):
+    """
+    apply one move to each board
+
+    The directions are LEFT, RIGHT, UP or DOWN, either one for every board or
+    a single value for the whole batch. Returns the next boards (in the same
+    form as the input), the points gained by each move, a mask of the boards
+    that changed and a mask of the next boards that are game over.
+    """
+    boards = np.asarray(boards)
+    packed = boards.ndim == 1
+    if not packed:
+        boards = pack(boards)
+    boards = boards.astype(np.uint64)
+    directions = np.broadcast_to(np.asarray(directions), boards.shape)
+
+    vertical = (directions == UP) | (directions == DOWN)
+    right = (directions == RIGHT) | (directions == DOWN)
+    turned = np.where(vertical, transpose(boards), boards)
+    moved, points = _move_rows(turned, right)
+    next_boards = np.where(vertical, transpose(moved), moved)
+
+    changed = next_boards != boards
+    game_over = is_game_over(next_boards)
+    if not packed:
+        next_boards = unpack(next_boards)
+    return next_boards, points, changed, game_over
+
+
+def has_gaps(boards):
+    """a mask of the boards with at least one empty cell"""
+    occupied = boards | (boards >> np.uint64(1))
+    occupied |= occupied >> np.uint64(2)
+    ones = np.uint64(0x1111111111111111)
+    return (occupied & ones) != ones
+
+
+def is_game_over(boards):
+    """a mask of the boards which are full and can't be changed by any move"""
+    boards = np.asarray(boards)
+    if boards.ndim != 1:
+        boards = pack(boards)
+    boards = boards.astype(np.uint64)
+    tables = get_tables()
+    stuck = ~has_gaps(boards)
+    for turned in (boards, transpose(boards)):
+        for shift in SHIFTS:
+            rows = (turned >> shift) & ROW_MASK
+            stuck &= tables.changed[rows] == 0
+    return stuck
@@ -0,0 +1,182 @@
+"""
+Timing the 2048 core functions
+
+The grids are collected by playing seeded random games, so the timings
+reflect boards that actually turn up in play. Results are printed and can be
+written as JSON. Given a baseline from an earlier run, any benchmark that
+has become slower by more than the threshold is reported as a regression
+and the script exits with status 1.
+
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from random import Random
+
+import core
+import simulate
+from game import Game
+
+
+def sample_grids(count=1000, seed=0, size=4):
+    """grids collected from seeded games played with random moves"""
+    rng = Random(seed)
+    grids = []
+    game = Game(rng=rng, size=size, undo_depth=0)
+    while len(grids) < count:
+        if game.game_over:
+            game = Game(rng=rng, size=size, undo_depth=0)
+        grids.append([list(row) for row in game.grid])
+        game.process_command(rng.choice(sorted(game.directions)))
+    return grids
+
+
+def per_call(function, inputs, repeat=5, copy=False):
+    """
+    the best time in microseconds of calling function on each input
+
+    Each input is a tuple of arguments. Functions which change their
+    arguments, like merge_left, need copy=True so every repeat starts from
+    the same data; the copying isn't included in the time.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        calls = [tuple(list(a) for a in args) for args in inputs] if copy else inputs
+        start = time.perf_counter()
+        for args in calls:
+            function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best / len(inputs) * 1_000_000
+
+
+# how process_command worked before core.move existed
+MOVES = {
+    "left": (core.move_left, core.horizontal_points),
+    "right": (core.move_right, core.horizontal_points),
+    "up": (core.move_up, core.vertical_points),
+    "down": (core.move_down, core.vertical_points),
+}
+
+def move_then_score(grid, direction):
+    move, points = MOVES[direction]
+    next_grid = move(grid)
+    return next_grid, points(grid), next_grid != grid
+
+
+def core_benchmarks(grids):
+    """microseconds per call for each of the core functions"""
+    rows = [(row,) for grid in grids for row in grid]
+    stacked = [(core.stack_left(row),) for (row,) in rows]
+    boards = [(grid,) for grid in grids]
+    moves = [(grid, direction) for grid in grids for direction in core.DIRECTIONS]
+    return {
+        "stack_left": per_call(core.stack_left, rows),
+        "merge_left": per_call(core.merge_left, stacked, copy=True),
+        "row_left": per_call(core.row_left, rows),
+        "move_left": per_call(core.move_left, boards),
+        "move_right": per_call(core.move_right, boards),
+        "move_up": per_call(core.move_up, boards),
+        "move_down": per_call(core.move_down, boards),
+        "move": per_call(core.move, moves),
+        "move_then_score": per_call(move_then_score, moves),
+        "transpose": per_call(core.transpose, boards),
+        "is_game_over": per_call(core.is_game_over, boards),
+        "legal_moves": per_call(core.legal_moves, boards),
+        "horizontal_points": per_call(core.horizontal_points, boards),
+        "vertical_points": per_call(core.vertical_points, boards),
+    }
+
+
+def size_benchmarks(sizes=range(3, 9), count=1000):
+    """microseconds per core.move for each size of grid"""
+    results = {}
+    for size in sizes:
+        grids = sample_grids(count, size=size)
+        inputs = [(grid, direction) for grid in grids for direction in core.DIRECTIONS]
+        # one untimed pass so every size is measured with its table filled
+        per_call(core.move, inputs, repeat=1)
+        results[f"move_{size}x{size}"] = per_call(core.move, inputs)
+    return results
+
+
+def game_benchmark(games=20, seed=0):
+    """microseconds per whole game played by the random policy"""
+    return {"game": per_call(simulate.play_game, [(n, seed) for n in range(games)], repeat=3)}
+
+
+def run(count=1000, seed=0, games=20):
+    """every benchmark, keyed by name, in microseconds per call"""
+    grids = sample_grids(count, seed)
+    results = core_benchmarks(grids)
+    results.update(size_benchmarks(count=count))
+    results.update(game_benchmark(games, seed))
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """the benchmarks more than threshold (0.2 is 20%) slower than the baseline"""
+    slower = {}
+    for name, microseconds in results.items():
+        before = baseline.get(name)
+        if before and microseconds > before * (1 + threshold):
+            slower[name] = microseconds / before - 1
+    return slower
+
+
+def report(results, baseline=None):
+    """a line of text for each benchmark, with the change from the baseline"""
+    lines = []
+    for name, microseconds in results.items():
+        line = f"{name:>18}: {microseconds:12.2f} µs {1_000_000 / microseconds:14,.0f}/s"
+        if baseline and baseline.get(name):
+            line += f" {microseconds / baseline[name] - 1:+8.1%}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the 2048 core functions")
+    parser.add_argument("--count", type=int, default=1000, help="number of sample grids")
+    parser.add_argument("--games", type=int, default=20, help="number of whole games")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved in this JSON file")
+    parser.add_argument("--save-baseline", help="save the results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fractional slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.count, args.seed, args.games)
+    document = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "count": args.count,
+        "seed": args.seed,
+        "microseconds": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(document, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["microseconds"]
+    print(report(results, baseline))
+
+    if baseline:
+        slower = regressions(results, baseline, args.threshold)
+        for name, change in slower.items():
+            print(f"REGRESSION {name} is {change:.1%} slower than the baseline")
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+A packed 64-bit version of the 2048 tile grid
+
+Each of the 16 cells is stored as a 4-bit exponent, so a tile of 2 is stored
+as 1, 4 as 2, 2048 as 11 and an empty cell as 0. Row 0 occupies the lowest 16
+bits and, within a row, column 0 is the lowest 4 bits. The largest tile that
+fits is 32768, merging two of them leaves a 32768 tile.
+
+The functions mirror those in core.py but take and return plain integers.
+Moves and points are looked up in tables covering every possible 16-bit row,
+which are built the first time they are needed. Run this module directly to
+save the tables to disk so later runs can load them instead.
+"""
+from array import array
+from collections import namedtuple
+from pathlib import Path
+import sys
+
+ROW_COUNT = 1 << 16
+ROW_MASK = 0xFFFF
+CELL_MASK = 0xF
+MAX_EXPONENT = 15
+
+
+def from_grid(grid):
+    """pack a list-of-lists grid into a single integer"""
+    board = 0
+    for r, row in enumerate(grid):
+        for c, value in enumerate(row):
+            if value:
+                exponent = value.bit_length() - 1
+                if value != 1 << exponent or not 0 < exponent <= MAX_EXPONENT:
+                    raise ValueError(f"Cannot pack tile value {value!r}")
+                board |= exponent << (4 * (4 * r + c))
+    return board
+
+
+def to_grid(board):
+    """unpack an integer into a list-of-lists grid"""
+    grid = []
+    for r in range(4):
+        row = []
+        for c in range(4):
+            exponent = (board >> (4 * (4 * r + c))) & CELL_MASK
+            row.append(1 << exponent if exponent else None)
+        grid.append(row)
+    return grid
+
+
+def get_row(board, r):
+    """the 16-bit value of row r"""
+    return (board >> (16 * r)) & ROW_MASK
+
+
+def unpack_row(row):
+    """split a 16-bit row into a list of four exponents"""
+    return [(row >> (4 * c)) & CELL_MASK for c in range(4)]
+
+
+def pack_row(exponents):
+    """combine four exponents into a 16-bit row"""
+    row = 0
+    for c, exponent in enumerate(exponents):
+        row |= exponent << (4 * c)
+    return row
+
+
+def reverse_row(row):
+    """flip a 16-bit row horizontally"""
+    return (
+        (row >> 12) |
+        ((row >> 4) & 0x00F0) |
+        ((row << 4) & 0x0F00) |
+        ((row << 12) & 0xF000)
+    )
+
+
+def slide_row(row):
+    """
+    calculate a left move of a 16-bit row from scratch
+
+    Returns the new row and the points scored. This is used to build the
+    lookup tables, everything else should use row_left and row_right.
+    """
+    tiles = [e for e in unpack_row(row) if e]
+    result = []
+    points = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            exponent = min(tiles[i] + 1, MAX_EXPONENT)
+            result.append(exponent)
+            points += 1 << (tiles[i] + 1)
+            i += 2
+        else:
+            result.append(tiles[i])
+            i += 1
+    result += [0] * (4 - len(result))
+    return pack_row(result), points
+
+
+RowTables = namedtuple("RowTables", ["left", "right", "points", "changed"])
+TABLE_PATH = Path(__file__).parent / "row_tables.bin"
+TABLE_MAGIC = b"2048ROWS"
+LEFT_CHANGED = 1
+RIGHT_CHANGED = 2
+
+_tables = None
+
+
+def build_tables():
+    """calculate the result of moving every possible row left and right"""
+    left = array("H", bytes(2 * ROW_COUNT))
+    right = array("H", bytes(2 * ROW_COUNT))
+    points = array("I", bytes(4 * ROW_COUNT))
+    changed = array("B", bytes(ROW_COUNT))
+    for row in range(ROW_COUNT):
+        moved, score = slide_row(row)
+        left[row] = moved
+        points[row] = score
+        changed[row] |= LEFT_CHANGED if moved != row else 0
+        reversed_row = reverse_row(row)
+        right[reversed_row] = reverse_row(moved)
+        changed[reversed_row] |= RIGHT_CHANGED if moved != row else 0
+    return RowTables(left, right, points, changed)
+
+
+def save_tables(path=TABLE_PATH):
+    """write the lookup tables to disk so they don't need building again"""
+    with open(path, "wb") as f:
+        f.write(TABLE_MAGIC)
+        for table in get_tables():
+            if sys.byteorder == "big":
+                table = array(table.typecode, table)
+                table.byteswap()
+            table.tofile(f)
+
+
+def load_tables(path=TABLE_PATH):
+    """read lookup tables previously written by save_tables"""
+    with open(path, "rb") as f:
+        if f.read(len(TABLE_MAGIC)) != TABLE_MAGIC:
+            raise ValueError(f"{path} is not a row table file")
+        tables = []
+        for typecode in "HHIB":
+            table = array(typecode)
+            try:
+                table.fromfile(f, ROW_COUNT)
+            except EOFError:
+                raise ValueError(f"{path} is truncated") from None
+            if sys.byteorder == "big":
+                table.byteswap()
+            tables.append(table)
+    return RowTables(*tables)
+
+
+def get_tables():
+    """the row lookup tables, loaded from TABLE_PATH or built on first use"""
+    global _tables
+    if _tables is None:
+        try:
+            _tables = load_tables()
+        except (OSError, ValueError):
+            _tables = build_tables()
+    return _tables
+
+
+def row_left(row):
+    """move a 16-bit row to the left, returning the new row and the points scored"""
+    tables = get_tables()
+    return tables.left[row], tables.points[row]
+
+
+def row_right(row):
+    """move a 16-bit row to the right, returning the new row and the points scored"""
+    tables = get_tables()
+    return tables.right[row], tables.points[row]
+
+
+def transpose(board):
+    """flip the board diagonally"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _apply_rows(board, table):
+    return (
+        table[board & ROW_MASK] |
+        table[(board >> 16) & ROW_MASK] << 16 |
+        table[(board >> 32) & ROW_MASK] << 32 |
+        table[(board >> 48) & ROW_MASK] << 48
+    )
+
+
+def move_left(board):
+    """move every row to the left"""
+    return _apply_rows(board, get_tables().left)
+
+
+def move_right(board):
+    """move every row to the right"""
+    return _apply_rows(board, get_tables().right)
+
+
+def move_up(board):
+    """move up by transposing the board and moving left"""
+    return transpose(move_left(transpose(board)))
+
+
+def move_down(board):
+    """move down by transposing the board and moving right"""
+    return transpose(move_right(transpose(board)))
+
+
+def horizontal_points(board):
+    """the points scored by moving left or right"""
+    points = get_tables().points
+    return (
+        points[board & ROW_MASK] +
+        points[(board >> 16) & ROW_MASK] +
+        points[(board >> 32) & ROW_MASK] +
+        points[(board >> 48) & ROW_MASK]
+    )
+
+
+def vertical_points(board):
+    """the points scored by moving up or down"""
+    return horizontal_points(transpose(board))
+
+
+def has_gaps(board):
+    """true if any cell is empty"""
+    occupied = board | (board >> 1)
+    occupied |= occupied >> 2
+    return occupied & 0x1111111111111111 != 0x1111111111111111
+
+
+def legal_moves(board):
+    """the set of directions that would change the board, without moving it"""
+    changed = get_tables().changed
+    legal = set()
+    for b, directions in ((board, ("left", "right")), (transpose(board), ("up", "down"))):
+        flags = (
+            changed[b & ROW_MASK] | changed[(b >> 16) & ROW_MASK] |
+            changed[(b >> 32) & ROW_MASK] | changed[(b >> 48) & ROW_MASK]
+        )
+        if flags & LEFT_CHANGED:
+            legal.add(directions[0])
+        if flags & RIGHT_CHANGED:
+            legal.add(directions[1])
+    return legal
+
+
+def is_game_over(board):
+    """true if the board is full and no move can change it"""
+    return not has_gaps(board) and (
+        move_left(board) == board and
+        move_right(board) == board and
+        move_up(board) == board and
+        move_down(board) == board
+    )
+
+
+if __name__ == "__main__":
+    save_tables()
+    print(f"Saved row tables to {TABLE_PATH}")
@@ -1,4 +1,26 @@
-"""Functions implementing the core behaviour of the 2048 tile grid"""
+"""
+Functions implementing the core behaviour of the 2048 tile grid
+
+stack_left, merge_left and row_left describe how a single row moves. The
+grid functions don't call them directly, instead each row is looked up in a
+table holding the left and right moves and the points for the row.
+
+Grids can be any square size and there is one table per row length. Shorter
+rows than four are all worked out up front. The table for rows of four starts
+empty and each row is added the first time it is seen, read from the packed
+bitboard tables so startup only costs loading those. Longer rows have too
+many possibilities to work out up front, so they are also added as they are
+seen, calculated from scratch.
+"""
+from itertools import product
+
+import bitboard
+
+# the most rows kept in a table that fills up as rows are seen. An entry takes
+# 350 to 450 bytes for rows of five to eight, so each such table stays under
+# about 15 MB. When a table is full it is emptied and starts filling again,
+# as tiles only grow and rows from earlier in a game rarely come back.
+MAX_CACHED_ROWS = 1 << 15
 
 def stack_left(row):
     """move the non-None items in one row to the left"""
@@ -6,7 +28,7 @@ def stack_left(row):
 
 def merge_left(stacked_row):
     """Merge similar non-None items to the left"""
-    for i in range(3):
+    for i in range(len(stacked_row) - 1):
         if stacked_row[i] and stacked_row[i] == stacked_row[i+1]:
             stacked_row[i] *= 2
             stacked_row[i + 1] = None
@@ -18,19 +40,102 @@ def row_left(row):
     merged = merge_left(stacked)
     return stack_left(merged)
 
+def row_right(row):
+    """A right move is a left move of the reversed row"""
+    return list(reversed(row_left(list(reversed(row)))))
+
+def row_points(row):
+    """The points scored by moving a single row"""
+    row = stack_left(row)
+    points = 0
+    for col in range(len(row) - 1):
+        if row[col] and row[col] == row[col + 1]:
+            points += row[col] * 2
+            row[col] = None
+            row[col + 1] = None
+    return points
+
+def calculate_row(row):
+    """Work out the (left, right, points, changed) entry for a row from scratch"""
+    left = tuple(row_left(row))
+    right = tuple(row_right(row))
+    row = tuple(row)
+    changed = (left != row) * bitboard.LEFT_CHANGED | (right != row) * bitboard.RIGHT_CHANGED
+    return left, right, row_points(row), changed
+
+_row_tables = {}
+
+# the tile for each exponent in a packed row, None for an empty cell
+TILES = [None] + [1 << e for e in range(1, bitboard.MAX_EXPONENT + 1)]
+
+def packed_entry(row):
+    """
+    The (left, right, points, changed) entry for a row of four from the bitboard tables
+
+    Returns None for rows the packed tables can't represent, holding tiles
+    that aren't powers of two, tiles above 32768 or two 32768 tiles, whose
+    merge the tables cut short.
+    """
+    try:
+        packed = bitboard.from_grid([row])
+    except ValueError:
+        return None
+    if row.count(32768) > 1:
+        return None
+    tables = bitboard.get_tables()
+    return (
+        tuple(TILES[e] for e in bitboard.unpack_row(tables.left[packed])),
+        tuple(TILES[e] for e in bitboard.unpack_row(tables.right[packed])),
+        tables.points[packed],
+        tables.changed[packed]
+    )
+
+def build_row_table(size=4):
+    """
+    Map rows of the given length to their (left, right, points, changed) entry
+
+    Only rows shorter than four are filled in here. Other tables start empty
+    and fill up as rows are seen, though the bitboard tables are loaded
+    straight away for rows of four.
+    """
+    if size == 4:
+        bitboard.get_tables()
+    if size >= 4:
+        return {}
+    return {row: calculate_row(row) for row in product(TILES, repeat=size)}
+
+def get_row_table(size=4):
+    """The row table for rows of one length, built on first use"""
+    if size not in _row_tables:
+        _row_tables[size] = build_row_table(size)
+    return _row_tables[size]
+
+def lookup_row(row):
+    """The table entry for a row, added to the table if it isn't there yet"""
+    key = tuple(row)
+    try:
+        return _row_tables[len(key)][key]
+    except KeyError:
+        table = get_row_table(len(key))
+        entry = table.get(key)
+        if entry is None:
+            entry = (len(key) == 4 and packed_entry(key)) or calculate_row(key)
+            if len(table) >= MAX_CACHED_ROWS:
+                table.clear()
+            table[key] = entry
+        return entry
+
 def move_left(grid):
     """moving a full grid to the left by moving each row to the left"""
-    return [row_left(row) for row in grid]
+    return [list(lookup_row(row)[0]) for row in grid]
 
 def reverse(grid):
     """flip the grid horizontally"""
     return [list(reversed(row)) for row in grid]
 
 def move_right(grid):
-    """move right by flipping the grid and moving left"""
-    grid = reverse(grid)
-    grid = move_left(grid)
-    return reverse(grid)
+    """moving a full grid to the right by moving each row to the right"""
+    return [list(lookup_row(row)[1]) for row in grid]
 
 def transpose(grid):
     """flip the grid diagonally"""
@@ -48,6 +153,10 @@ def move_down(grid):
     grid = move_right(grid)
     return transpose(grid)
 
+def empty_grid(size=4):
+    """A square grid with no tiles"""
+    return [[None] * size for _ in range(size)]
+
 def has_gaps(grid):
     for row in grid:
         if None in row:
@@ -55,16 +164,16 @@ def has_gaps(grid):
     return False
 
 def has_vertical_merges(data):
-    for row in range(3):
-        for col in range(4):
-            if data[row][col] == data[row + 1][col]:
+    for row in range(len(data) - 1):
+        for col in range(len(data[row])):
+            if data[row][col] and data[row][col] == data[row + 1][col]:
                 return True
     return False
 
 def has_horizontal_merges(data):
-    for row in range(4):
-        for col in range(3):
-            if data[row][col] == data[row][col + 1]:
+    for row in range(len(data)):
+        for col in range(len(data[row]) - 1):
+            if data[row][col] and data[row][col] == data[row][col + 1]:
                 return True
     return False
 
@@ -76,17 +185,92 @@ def is_game_over(data):
         has_horizontal_merges(data)
     )
 
+# for each direction, whether it works on columns, which entry of the row
+# table holds the result and which changed flag goes with it
+DIRECTIONS = {
+    "left": (False, 0, bitboard.LEFT_CHANGED),
+    "right": (False, 1, bitboard.RIGHT_CHANGED),
+    "up": (True, 0, bitboard.LEFT_CHANGED),
+    "down": (True, 1, bitboard.RIGHT_CHANGED),
+}
 
-def horizontal_points(data):
-    data = [stack_left(row) for row in data]
+def move(grid, direction):
+    """
+    Move the grid in one direction in a single pass
+
+    Returns the new grid, the points scored and whether anything changed.
+    """
+    vertical, index, flag = DIRECTIONS[direction]
+    lines = zip(*grid) if vertical else grid
+    result = []
     points = 0
-    for row in range(4):
-        for col in range(3):
-            if data[row][col] and data[row][col] == data[row][col + 1]:
-                points += data[row][col] * 2
-                data[row][col] = None
-                data[row][col + 1] = None
-    return points
+    changed = 0
+    for line in lines:
+        entry = lookup_row(line)
+        result.append(list(entry[index]))
+        points += entry[2]
+        changed |= entry[3]
+    if vertical:
+        result = transpose(result)
+    return result, points, bool(changed & flag)
+
+def row_slides(row):
+    """Where each tile in a row goes on a left move, as (from, to) column pairs"""
+    result = []
+    target = -1
+    last = None
+    for col, tile in enumerate(row):
+        if not tile:
+            continue
+        if tile == last:
+            result.append((col, target))
+            last = None
+        else:
+            target += 1
+            result.append((col, target))
+            last = tile
+    return result
+
+def slides(grid, direction):
+    """Where each tile on the grid goes, as ((row, col), (row, col)) pairs"""
+    vertical, index, flag = DIRECTIONS[direction]
+    lines = transpose(grid) if vertical else grid
+    last = len(grid) - 1
+    result = []
+    for i, line in enumerate(lines):
+        if index:
+            line = line[::-1]
+        for a, b in row_slides(line):
+            if index:
+                a, b = last - a, last - b
+            if vertical:
+                result.append(((a, i), (b, i)))
+            else:
+                result.append(((i, a), (i, b)))
+    return result
+
+def legal_moves(grid):
+    """The set of directions that would change the grid, without moving it"""
+    rows = 0
+    for row in grid:
+        rows |= lookup_row(row)[3]
+    cols = 0
+    for col in zip(*grid):
+        cols |= lookup_row(col)[3]
+    legal = set()
+    if rows & bitboard.LEFT_CHANGED:
+        legal.add("left")
+    if rows & bitboard.RIGHT_CHANGED:
+        legal.add("right")
+    if cols & bitboard.LEFT_CHANGED:
+        legal.add("up")
+    if cols & bitboard.RIGHT_CHANGED:
+        legal.add("down")
+    return legal
+
+
+def horizontal_points(data):
+    return sum(lookup_row(row)[2] for row in data)
 
 def vertical_points(grid):
     grid = transpose(grid)
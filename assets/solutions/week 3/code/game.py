@@ -1,30 +1,48 @@
-from random import randint, choice
+import sys
+from random import Random
 
+import ai
 import core
+import history
+import replay
+import spawn
+import stats
+import turn
 
 class Game:
-    def __init__(self):
-        self.grid = [[None, None, None, None],
-                     [None, None, None, None],
-                     [None, None, None, None],
-                     [None, None, None, None]]
-
-        self.set_random_empty_tile(2)
-        self.set_random_empty_tile(2)
-
-        self.moves = {
-            "W": core.move_up,
-            "A": core.move_left,
-            "S": core.move_down,
-            "D": core.move_right
-        }
-        self.point_functions = {
-            "W": core.vertical_points,
-            "A": core.horizontal_points,
-            "S": core.vertical_points,
-            "D": core.horizontal_points            
+    def __init__(self, rng=None, seed=None, size=4, recorder=None, undo_depth=1000, stats=None):
+        self.rng = rng or Random(seed)
+        self.spawner = spawn.Spawner(self.rng)
+        self.size = size
+        self.grid = core.empty_grid(size)
+
+        first = self.set_random_empty_tile(2)
+        second = self.set_random_empty_tile(2)
+
+        self.history = history.History(size, undo_depth)
+        # an optional stats.Stats which times every move
+        self.stats = stats
+
+        # an optional replay.ReplayWriter which every move is written to
+        self.recorder = recorder
+        if recorder:
+            recorder.start(size, seed=seed)
+            recorder.spawn(first, 2)
+            recorder.spawn(second, 2)
+
+        self.commands = {
+            "up": "W",
+            "left": "A",
+            "down": "S",
+            "right": "D"
         }
+        self.directions = {c: d for d, c in self.commands.items()}
+        self.legal = core.legal_moves(self.grid)
+        # the solver works on packed boards, which are always 4x4
+        self.solver = ai.Solver() if size == 4 else None
         self.score = 0
+        self.game_over = False
+        self.playing = True
 
     def __str__(self):
         tiles = [[str(t or ".").center(4) for t in row] for row in self.grid]
@@ -37,26 +55,78 @@ class Game:
         return f"\nSCORE: {self.score}\n\n{result}\n{msg}"
 
     def set_random_empty_tile(self, value):
-        while(True):
-            row = randint(0, 3)
-            col = randint(0, 3)
-            if not self.grid[row][col]:
-                break
-        self.grid[row][col] = value
+        return self.spawner.spawn(self.grid, value)
 
     def process_command(self, command):
-        next_grid = self.moves[command](self.grid)
-        if next_grid != self.grid:
-            self.score += self.point_functions[command](self.grid)
-            self.grid = next_grid
-            new_tile = choice([2, 2, 2, 4])
-            self.set_random_empty_tile(new_tile)
-            self.game_over = core.is_game_over(self.grid)
+        result = turn.play(self.grid, self.score, self.legal, self.directions[command],
+                           self.spawner, self.history, self.stats, self.recorder)
+        if result:
+            self.grid, self.score, self.legal = result
+            self.game_over = not self.legal
+
+    def set_position(self, grid, score):
+        self.grid = grid
+        self.score = score
+        self.legal = core.legal_moves(self.grid)
+        self.game_over = not self.legal
+
+    def undo(self):
+        """go back one move, returning False if there is nothing to undo"""
+        position = turn.undo(self.grid, self.score, self.history, self.recorder)
+        if position:
+            self.set_position(*position)
+        return bool(position)
+
+    def redo(self):
+        """replay the last undone move, returning False if there is nothing to redo"""
+        position = turn.redo(self.grid, self.score, self.history, self.recorder)
+        if position:
+            self.set_position(*position)
+        return bool(position)
+
+    def hint(self):
+        """the command the solver would play next"""
+        solver = self.solver
+        if solver is None:
+            print("\nHints are only available on a 4x4 grid")
+            return None
+        direction = solver.best_move(self.grid)
+        print(f"\n{solver.nodes} nodes to depth {solver.depth}, "
+              f"{solver.nodes_per_second:,.0f} nodes/s")
+        return self.commands.get(direction)
+
+    def autoplay(self):
+        """let the solver play until the game ends or ctrl-c is pressed"""
+        try:
+            while self.solver and not self.game_over:
+                hint = self.hint()
+                if hint is None:
+                    break
+                self.process_command(hint)
+                print(self)
+        except KeyboardInterrupt:
+            print("\nAutoplay stopped")
 
     def next_move(self):
         print(self)
-        commands = input("\nmove (W=Up, A=Left, S=Down, D=Right, Q=Quit): ").upper()
+        commands = input("\nmove (W=Up, A=Left, S=Down, D=Right, U=Undo, R=Redo, H=Hint, P=Autoplay, Q=Quit): ").upper()
         for c in commands:
+            if c == "U":
+                if not self.undo():
+                    print("\nNothing to undo")
+                continue
+            if c == "R":
+                if not self.redo():
+                    print("\nNothing to redo")
+                continue
+            if c == "H":
+                hint = self.hint()
+                if hint:
+                    print(f"\nHint: {hint}")
+                continue
+            if c == "P":
+                self.autoplay()
+                continue
             try:
                 self.process_command(c)
             except KeyError:
@@ -73,5 +143,17 @@ class Game:
         print(self)
 
 if __name__ == "__main__":
-    g = Game()
-    g.play()
\ No newline at end of file
+    args = [a for a in sys.argv[1:] if a != "--stats"]
+    size = int(args[0]) if args else 4
+    # --stats prints the move timings as json at the end of the game
+    collected = stats.Stats() if "--stats" in sys.argv else None
+    if len(args) > 1:
+        # record the game by naming a replay file
+        with open(args[1], "ab") as f:
+            g = Game(size=size, recorder=replay.ReplayWriter(f), stats=collected)
+            g.play()
+    else:
+        g = Game(size=size, stats=collected)
+        g.play()
+    if collected:
+        print(collected.to_json(indent=2))
\ No newline at end of file
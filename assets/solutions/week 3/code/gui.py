@@ -1,7 +1,14 @@
+import sys
+import time
 import tkinter as tk
-from random import randint, choice
+from functools import lru_cache
 
+import ai
 import core
+import history
+import spawn
+import stats
+import turn
 
 normal = ("Helvetica", 24, "bold")
 
@@ -34,6 +41,17 @@ fonts = {
     2048: ("Helvetica", 16, "bold")
 }
 
+@lru_cache(maxsize=None)
+def tile_style(value):
+    """the options for a tile showing value, worked out once for each value"""
+    return {
+        "text": value or " ",
+        "bg": tile_colours.get(value, "#cdc1b4"),
+        "fg": font_colours.get(value, "#f9f6f2"),
+        "font": fonts.get(value, normal)
+    }
+
+
 class Tile(tk.Label):
     """
     A custom label whose colours and font are determined by the value it's given
@@ -42,17 +60,175 @@ class Tile(tk.Label):
         super().__init__(parent, anchor=tk.CENTER)
 
     def set(self, value):
-        self.configure(
-            text=value or " ",
-            bg=tile_colours.get(value, "#cdc1b4"),
-            fg=font_colours.get(value, "#f9f6f2"),
-            font=fonts.get(value, normal)
-        )
+        self.configure(**tile_style(value))
+
+
+class LabelBoard(tk.Frame):
+    """
+    The board as a grid of Tile labels, redrawn without animation
+    """
+    animated = False
+
+    def __init__(self, parent, size):
+        super().__init__(parent, padx=10, pady=10, bg=bg2)
+        self.tiles = {}
+        for row in range(size):
+            for col in range(size):
+                self.tiles[(row, col)] = Tile(self)
+                self.tiles[(row, col)].grid(row=row, column=col, sticky="news", padx=10, pady=10)
+
+        cell_size = min(150, 600 // size)
+        for i in range(size):
+            self.rowconfigure(i, minsize=cell_size)
+            self.columnconfigure(i, minsize=cell_size)
+        self.drawn = {}
+
+    def show(self, grid, slides=None):
+        """reconfigure only the tiles whose value has changed since the last frame"""
+        for (row, col), tile in self.tiles.items():
+            value = grid[row][col] or ""
+            if self.drawn.get((row, col)) != value:
+                tile.set(value)
+                self.drawn[(row, col)] = value
+
+
+class CanvasBoard(tk.Canvas):
+    """
+    The board drawn on a single canvas, with tiles sliding into place
+
+    Every tile is a rectangle and a text item which live as long as the
+    board does. Moving tiles slide for duration_ms, with a frame every
+    frame_ms. Positions come from the time since the slide started, so slow
+    frames are skipped rather than slowing the slide down, and a new move
+    arriving mid-slide snaps the old one to its end.
+    """
+    animated = True
+
+    def __init__(self, parent, size, duration_ms=100, frame_ms=16):
+        self.cell = min(150, 600 // size)
+        self.gap = 10
+        width = size * self.cell + self.gap * 2
+        super().__init__(parent, width=width, height=width, bg=bg2, highlightthickness=0)
+        self.duration_ms = duration_ms
+        self.frame_ms = frame_ms
+        for row in range(size):
+            for col in range(size):
+                self.create_rectangle(*self.bounds(row, col), fill="#cdc1b4", width=0)
+        self.items = {}     # (row, col) -> (rect, text) of the tile in that cell
+        self.values = {}    # rect -> value currently shown
+        self.spare = []     # hidden (rect, text) pairs ready for reuse
+        self.moving = []
+        self.target = None
+        self.animation = None
+
+    def bounds(self, row, col):
+        """the corners of a cell, allowing for the gap between tiles"""
+        x = self.gap * 2 + col * self.cell
+        y = self.gap * 2 + row * self.cell
+        return x, y, x + self.cell - self.gap * 2, y + self.cell - self.gap * 2
+
+    def show(self, grid, slides=None):
+        """draw the grid, sliding tiles from the given (from, to) pairs if any"""
+        self.finish()
+        if not slides:
+            self.arrange(grid)
+            return
+        self.moving = []
+        items = {}
+        for start, end in slides:
+            item = self.items.pop(start, None)
+            if item is None:
+                continue
+            dx = (end[1] - start[1]) * self.cell
+            dy = (end[0] - start[0]) * self.cell
+            self.moving.append((item, dx, dy))
+            if end in items:
+                # the second tile of a merged pair is no longer needed
+                self.spare.append(item)
+            else:
+                items[end] = item
+        self.spare.extend(self.items.values())
+        self.items = items
+        self.target = grid
+        self.offset = 0.0
+        self.started = time.perf_counter()
+        self.step()
+
+    def step(self):
+        """move the sliding tiles to where they should be by now"""
+        done = min(1.0, (time.perf_counter() - self.started) * 1000 / self.duration_ms)
+        for (rect, text), dx, dy in self.moving:
+            self.move(rect, dx * (done - self.offset), dy * (done - self.offset))
+            self.move(text, dx * (done - self.offset), dy * (done - self.offset))
+        self.offset = done
+        if done < 1.0:
+            self.animation = self.after(self.frame_ms, self.step)
+        else:
+            self.animation = None
+            self.finish()
+
+    def finish(self):
+        """jump any slide in progress to its end"""
+        if self.animation is not None:
+            self.after_cancel(self.animation)
+            self.animation = None
+        if self.target is not None:
+            target = self.target
+            self.target = None
+            self.moving = []
+            self.arrange(target)
+
+    def arrange(self, grid):
+        """put a tile item showing the right value in every occupied cell"""
+        for row, values in enumerate(grid):
+            for col, value in enumerate(values):
+                item = self.items.get((row, col))
+                if not value:
+                    if item:
+                        self.spare.append(self.items.pop((row, col)))
+                    continue
+                if item is None:
+                    item = self.spare.pop() if self.spare else (
+                        self.create_rectangle(0, 0, 0, 0, width=0),
+                        self.create_text(0, 0)
+                    )
+                    self.items[(row, col)] = item
+                    # a reused item may be hidden, so always reconfigure it
+                    self.values[item[0]] = None
+                rect, text = item
+                x0, y0, x1, y1 = self.bounds(row, col)
+                self.coords(rect, x0, y0, x1, y1)
+                self.coords(text, (x0 + x1) / 2, (y0 + y1) / 2)
+                if self.values[rect] != value:
+                    style = tile_style(value)
+                    self.itemconfigure(rect, fill=style["bg"], state="normal")
+                    self.itemconfigure(text, text=style["text"], fill=style["fg"],
+                                       font=style["font"], state="normal")
+                    self.values[rect] = value
+        for rect, text in self.spare:
+            if self.values.get(rect) is not None:
+                self.itemconfigure(rect, state="hidden")
+                self.itemconfigure(text, state="hidden")
+                self.values[rect] = None
+
+
+BOARDS = {
+    "labels": LabelBoard,
+    "canvas": CanvasBoard,
+}
 
 
 class Game(tk.Tk):
-    def __init__(self):
+    def __init__(self, seed=None, size=4, board="labels", recorder=None, undo_depth=1000, stats=None):
         super().__init__()
+        self.seed = seed
+        # an optional replay.ReplayWriter which every game is written to
+        self.recorder = recorder
+        self.undo_depth = undo_depth
+        # an optional stats.Stats which times every move
+        self.stats = stats
+        self.spawner = spawn.Spawner(seed=seed)
+        self.size = size
         self.title("py2048")
         self.configure(padx=50, pady=50, bg=bg1)
         self.columnconfigure(1, weight=1)
@@ -61,92 +237,191 @@ class Game(tk.Tk):
         tk.Label(text="SCORE: ", font=normal, bg=bg1, fg=fg1).grid(column=0, row=0)
         tk.Label(textvariable=self.score, font=normal, bg=bg1, fg=fg1).grid(column=1, row=0, sticky="w")
 
-        frame = tk.Frame(padx=10, pady=10, bg=bg2)
-        frame.grid(column=0, row=1, columnspan=2, sticky="news")
-
-        self.tiles = {}
-        for row in range(4):
-            for col in range(4):
-                self.tiles[(row, col)] = Tile(frame)
-                self.tiles[(row, col)].grid(row=row, column=col, sticky="news", padx=10, pady=10)
-
-        cell_size = 150
-        for i in range(4):
-            frame.rowconfigure(i, minsize=cell_size)
-            frame.columnconfigure(i, minsize=cell_size)
+        # either renderer can be used, the game logic is the same
+        self.board = BOARDS[board](self, size)
+        self.board.grid(column=0, row=1, columnspan=2, sticky="news")
 
         self.game_over_message = tk.Label(text="GAME OVER\n'r' to restart", font=normal, bg="white", padx=20, pady=20)
         self.game_over_message.grid(row=1, column=0, columnspan=2)
         # self.game_over_message.grid_remove()
 
-        self.moves = {
-            "Left": core.move_left,
-            "Right": core.move_right,
-            "Up": core.move_up,
-            "Down": core.move_down,
+        self.status = tk.StringVar(value="'u' undo, 'y' redo, 'h' hint, 'a' autoplay, 'f' frame times")
+        tk.Label(textvariable=self.status, bg=bg1, fg=fg1).grid(column=0, row=2, columnspan=2, sticky="w")
+
+        # drawing happens at most once per trip round the event loop, so
+        # several moves between frames only cost one redraw
+        self.drawn_game_over = None
+        self.slides = None
+        self.redraw_pending = False
+        self.frames = 0
+        self.frame_ms = 0.0
+        self.max_frame_ms = 0.0
+        self.dropped_inputs = 0
+        self.show_frame_stats = False
+        self.frame_stats = tk.StringVar()
+        tk.Label(textvariable=self.frame_stats, bg=bg1, fg=fg1).grid(column=0, row=3, columnspan=2, sticky="w")
+
+        self.commands = {
+            "up": "Up",
+            "left": "Left",
+            "down": "Down",
+            "right": "Right",
         }
-        for key in self.moves:
+        self.directions = {c: d for d, c in self.commands.items()}
+        for key in self.directions:
             self.bind(f"<{key}>", self.move_handler)
 
         self.bind(f"<KeyPress-r>", lambda ev: self.restart())
+        self.bind(f"<KeyPress-h>", lambda ev: self.show_hint())
+        self.bind(f"<KeyPress-a>", lambda ev: self.toggle_autoplay())
+        self.bind(f"<KeyPress-f>", lambda ev: self.toggle_frame_stats())
+        self.bind(f"<KeyPress-u>", lambda ev: self.undo())
+        self.bind(f"<KeyPress-y>", lambda ev: self.redo())
 
-        self.point_functions = {
-            "Left": core.horizontal_points,
-            "Right": core.horizontal_points,
-            "Up": core.vertical_points,
-            "Down": core.vertical_points,
-        }
+        # a small budget keeps each autoplay step well inside a frame or two
+        # the solver works on packed boards, which are always 4x4
+        self.solver = ai.Solver(budget_ms=30) if size == 4 else None
+        self.autoplaying = False
 
         self.restart()
         self.update()
 
 
     def restart(self):
-        self.grid = [[None, None, None, None],
-                     [None, None, None, None],
-                     [None, None, None, None],
-                     [None, None, None, None]]
+        self.grid = core.empty_grid(self.size)
+        self.history = history.History(self.size, self.undo_depth)
+        self.slides = None
 
-        self.set_random_empty_tile(2)
-        self.set_random_empty_tile(2)
+        first = self.set_random_empty_tile(2)
+        second = self.set_random_empty_tile(2)
+        if self.recorder:
+            self.recorder.start(self.size, seed=self.seed)
+            self.recorder.spawn(first, 2)
+            self.recorder.spawn(second, 2)
+        self.legal = core.legal_moves(self.grid)
         self.score.set(0)
         self.game_over = False
+        self.autoplaying = False
         self.update()
 
     def move_handler(self, ev):
+        if self.redraw_pending:
+            # the last move hasn't been drawn yet, so its frame is skipped
+            self.dropped_inputs += 1
         self.process_command(ev.keysym)
         self.update()
 
     def update(self):
-        for row in range(4):
-            for col in range(4):
-                self.tiles[(row, col)].set(self.grid[row][col] or "")
-        if self.game_over:
-            self.game_over_message.grid()
-        else:
-            self.game_over_message.grid_remove()
+        """ask for a redraw once the event loop is idle"""
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.after_idle(self.redraw)
+
+    def redraw(self):
+        """draw the board, sliding the tiles if only one move was made since the last frame"""
+        start = time.perf_counter()
+        self.redraw_pending = False
+        self.board.show(self.grid, self.slides)
+        self.slides = None
+        if self.game_over != self.drawn_game_over:
+            if self.game_over:
+                self.game_over_message.grid()
+            else:
+                self.game_over_message.grid_remove()
+            self.drawn_game_over = self.game_over
+
+        self.frames += 1
+        self.frame_ms = (time.perf_counter() - start) * 1000
+        self.max_frame_ms = max(self.max_frame_ms, self.frame_ms)
+        if self.show_frame_stats:
+            self.frame_stats.set(
+                f"frame {self.frame_ms:.2f} ms (max {self.max_frame_ms:.2f} ms), "
+                f"{self.frames} frames, {self.dropped_inputs} inputs without a frame"
+            )
+
+    def toggle_frame_stats(self):
+        self.show_frame_stats = not self.show_frame_stats
+        if not self.show_frame_stats:
+            self.frame_stats.set("")
+        self.update()
+
+
+    def set_position(self, position):
+        self.grid, score = position
+        self.score.set(score)
+        self.legal = core.legal_moves(self.grid)
+        self.game_over = not self.legal
+        self.slides = None
+        self.update()
+
+    def undo(self):
+        position = turn.undo(self.grid, self.score.get(), self.history, self.recorder)
+        if position:
+            self.set_position(position)
+
+    def redo(self):
+        position = turn.redo(self.grid, self.score.get(), self.history, self.recorder)
+        if position:
+            self.set_position(position)
+
+    def hint(self):
+        """the command the solver would play next, reporting its speed"""
+        direction = self.solver.best_move(self.grid)
+        self.status.set(
+            f"{(direction or '-').title()}: {self.solver.nodes} nodes to depth {self.solver.depth}, "
+            f"{self.solver.nodes_per_second:,.0f} nodes/s"
+        )
+        return self.commands.get(direction)
+
+    def show_hint(self):
+        if self.solver is None:
+            self.status.set("Hints are only available on a 4x4 grid")
+        elif not self.game_over:
+            self.hint()
+
+    def toggle_autoplay(self):
+        self.autoplaying = self.solver is not None and not self.autoplaying
+        if self.autoplaying:
+            self.after_idle(self.autoplay_step)
+
+    def autoplay_step(self):
+        if not self.autoplaying or self.game_over:
+            self.autoplaying = False
+            return
+        hint = self.hint()
+        if hint is None:
+            self.autoplaying = False
+            return
+        self.process_command(hint)
+        self.update()
+        self.after(10, self.autoplay_step)
 
 
     def set_random_empty_tile(self, value):
-        while(True):
-            row = randint(0, 3)
-            col = randint(0, 3)
-            if not self.grid[row][col]:
-                break
-        self.grid[row][col] = value
+        return self.spawner.spawn(self.grid, value)
 
 
     def process_command(self, command):
-        next_grid = self.moves[command](self.grid)
-        if next_grid != self.grid:
-            self.score.set(self.score.get() + self.point_functions[command](self.grid))
-            self.grid = next_grid
-            new_tile = choice([2, 2, 2, 4])
-            self.set_random_empty_tile(new_tile)
-            self.game_over = core.is_game_over(self.grid)
+        direction = self.directions[command]
+        if self.board.animated and direction in self.legal:
+            # only one move per frame is animated, any more skip straight to the end
+            self.slides = None if self.redraw_pending else core.slides(self.grid, direction)
+        result = turn.play(self.grid, self.score.get(), self.legal, direction,
+                           self.spawner, self.history, self.stats, self.recorder)
+        if result:
+            self.grid, score, self.legal = result
+            self.score.set(score)
+            self.game_over = not self.legal
 
 
 
 if __name__ == "__main__":
-    g = Game()
-    g.mainloop()
\ No newline at end of file
+    args = [a for a in sys.argv[1:] if a != "--stats"]
+    size = int(args[0]) if args else 4
+    board = args[1] if len(args) > 1 else "labels"
+    # --stats prints the move timings as json when the window is closed
+    collected = stats.Stats() if "--stats" in sys.argv else None
+    g = Game(size=size, board=board, stats=collected)
+    g.mainloop()
+    if collected:
+        print(collected.to_json(indent=2))
@@ -0,0 +1,134 @@
+"""
+Undo and redo for 2048 games
+
+Positions are packed into integers, a 4x4 grid into the same 64-bit board
+as bitboard.py, and kept in a ring buffer of fixed size. On a 4x4 grid the
+buffer is a pair of typed arrays, so each stored move costs 16 bytes (8 for
+the board and 8 for the score) no matter how long the game goes on. Larger
+grids don't fit in 64 bits, so they are kept as ordinary Python integers,
+and so is a 4x4 grid once it has a tile above 32768.
+
+Undo and redo swap the current position with one in the buffer, so they
+take the same time however deep the history is.
+"""
+import sys
+from array import array
+
+import bitboard
+
+# bits per cell for grids other than 4x4, enough for tiles up to 2 ** 63
+CELL_BITS = 6
+# set on 4x4 grids packed with CELL_BITS because a tile was too big for bitboard
+WIDE = 1 << (CELL_BITS * 16)
+
+
+def pack(grid):
+    """a grid as a single integer, one exponent per cell"""
+    if len(grid) == 4:
+        try:
+            return bitboard.from_grid(grid)
+        except ValueError:
+            # a merge of two 32768s makes a tile bitboard can't hold
+            return pack_wide(grid) | WIDE
+    return pack_wide(grid)
+
+
+def pack_wide(grid):
+    board = 0
+    for i, tile in enumerate(tile for row in grid for tile in row):
+        if tile:
+            board |= (tile.bit_length() - 1) << (CELL_BITS * i)
+    return board
+
+
+def unpack(board, size=4):
+    """the grid packed into an integer by pack"""
+    if size == 4 and board < WIDE:
+        return bitboard.to_grid(board)
+    mask = (1 << CELL_BITS) - 1
+    cells = [(board >> (CELL_BITS * i)) & mask for i in range(size * size)]
+    cells = [1 << e if e else None for e in cells]
+    return [cells[r * size:(r + 1) * size] for r in range(size)]
+
+
+class History:
+    """
+    A bounded undo and redo history of (grid, score) positions
+
+    depth is the most moves that can be undone. When it is reached the
+    oldest position is forgotten to make room. A depth of 0 turns undo off,
+    so nothing is saved and there is never anything to undo or redo.
+    """
+    def __init__(self, size=4, depth=1000):
+        if depth < 0:
+            raise ValueError(f"depth must be 0 or more, not {depth}")
+        self.size = size
+        self.depth = depth
+        if size == 4:
+            self.boards = array("Q", [0]) * depth
+            self.scores = array("Q", [0]) * depth
+        else:
+            self.boards = [0] * depth
+            self.scores = [0] * depth
+        self.cursor = 0
+        self.undo_count = 0
+        self.redo_count = 0
+
+    def __len__(self):
+        return self.undo_count
+
+    def save(self, grid, score):
+        """remember the position before a move, forgetting anything to redo"""
+        if not self.depth:
+            return
+        self.store(pack(grid))
+        self.scores[self.cursor] = score
+        self.cursor = (self.cursor + 1) % self.depth
+        self.undo_count = min(self.undo_count + 1, self.depth)
+        self.redo_count = 0
+
+    def store(self, board):
+        try:
+            self.boards[self.cursor] = board
+        except OverflowError:
+            # a wide 4x4 board doesn't fit the typed array, so from now on it is a list
+            self.boards = list(self.boards)
+            self.boards[self.cursor] = board
+
+    def swap(self, grid, score):
+        board = self.boards[self.cursor]
+        previous = self.scores[self.cursor]
+        self.store(pack(grid))
+        self.scores[self.cursor] = score
+        return unpack(board, self.size), previous
+
+    def undo(self, grid, score):
+        """the position before the last move, or None if there isn't one"""
+        if not self.undo_count:
+            return None
+        self.cursor = (self.cursor - 1) % self.depth
+        self.undo_count -= 1
+        self.redo_count += 1
+        return self.swap(grid, score)
+
+    def redo(self, grid, score):
+        """the position undone most recently, or None if there isn't one"""
+        if not self.redo_count:
+            return None
+        position = self.swap(grid, score)
+        self.cursor = (self.cursor + 1) % self.depth
+        self.undo_count += 1
+        self.redo_count -= 1
+        return position
+
+    def memory(self):
+        """the bytes used to store the history"""
+        total = sys.getsizeof(self.boards) + sys.getsizeof(self.scores)
+        if isinstance(self.boards, list):
+            total += sum(sys.getsizeof(b) for b in self.boards)
+            total += sum(sys.getsizeof(s) for s in self.scores)
+        return total
+
+    def bytes_per_move(self):
+        """the memory used for each move the history can hold"""
+        return self.memory() / self.depth if self.depth else 0
@@ -0,0 +1,261 @@
+"""
+Recording and replaying games of 2048
+
+A replay file is a sequence of games, each written as it is played so the
+file only ever grows at the end. Every game starts with a header record
+
+    0xFC, version, size, snapshot_every (2 bytes), initial tiles, seed length (2 bytes), seed
+
+followed by two bytes for each of the starting tiles
+
+    0x08 | tile, cell
+
+and two bytes for every move, the direction and the tile that appeared after it
+
+    direction | tile << 2, cell
+
+where tile is 0 for a 2 and 1 for a 4, and cell is row * size + col. As a
+cell is one byte, only grids up to 16x16 can be recorded. After
+every snapshot_every moves the whole board is written as well
+
+    0xFE, moves (4 bytes), score (8 bytes), one exponent byte per cell
+
+Moves and snapshots have a fixed size, so the position of any snapshot can
+be calculated and a reader can jump to move k by loading the snapshot before
+it and replaying at most snapshot_every moves. A game can end with 0xFD.
+"""
+import struct
+from collections import namedtuple
+
+import core
+
+VERSION = 1
+GAME = 0xFC
+END = 0xFD
+SNAPSHOT = 0xFE
+SPAWN = 0x08
+DIRECTIONS = list(core.DIRECTIONS)
+# every cell of the grid must fit in one byte
+MAX_SIZE = 16
+
+HEADER = struct.Struct("<BBBHBH")
+SNAPSHOT_HEADER = struct.Struct("<BIQ")
+
+Header = namedtuple("Header", ["size", "snapshot_every", "initial", "seed", "offset", "length"])
+Snapshot = namedtuple("Snapshot", ["moves", "score", "grid"])
+GameRecord = namedtuple("GameRecord", ["header", "spawns", "moves", "snapshots"])
+
+
+class ReplayError(ValueError):
+    """raised when a replay can't be read or doesn't follow the rules"""
+
+
+def tile_bit(value):
+    if value not in (2, 4):
+        raise ReplayError(f"Only 2 and 4 tiles can be recorded, not {value!r}")
+    return value >> 2
+
+
+def snapshot_size(size):
+    return SNAPSHOT_HEADER.size + size * size
+
+
+class ReplayWriter:
+    """
+    Append games to an open binary file as they are played
+
+    Call start at the beginning of each game, spawn for each starting tile
+    and move after every move. Each record is flushed straight away so
+    nothing is lost if the program stops mid-game.
+    """
+    def __init__(self, f, snapshot_every=256, flush=True):
+        self.f = f
+        self.snapshot_every = snapshot_every
+        self.flush = flush
+        self.size = None
+
+    def write(self, data):
+        self.f.write(data)
+        if self.flush:
+            self.f.flush()
+
+    def start(self, size=4, initial=2, seed=None):
+        """begin a new game"""
+        if size > MAX_SIZE:
+            raise ReplayError(f"Only grids up to {MAX_SIZE}x{MAX_SIZE} can be recorded, not {size}x{size}")
+        seed = b"" if seed is None else str(seed).encode()
+        self.size = size
+        self.moves = 0
+        self.write(HEADER.pack(GAME, VERSION, size, self.snapshot_every, initial, len(seed)) + seed)
+
+    def spawn(self, position, value):
+        """one of the starting tiles"""
+        row, col = position
+        self.write(bytes([SPAWN | tile_bit(value), row * self.size + col]))
+
+    def move(self, direction, position, value, grid, score):
+        """a move, the tile that appeared after it, and the grid and score it led to"""
+        row, col = position
+        data = bytes([DIRECTIONS.index(direction) | tile_bit(value) << 2, row * self.size + col])
+        self.moves += 1
+        if self.moves % self.snapshot_every == 0:
+            cells = bytes((tile or 1).bit_length() - 1 for line in grid for tile in line)
+            data += SNAPSHOT_HEADER.pack(SNAPSHOT, self.moves, score) + cells
+        self.write(data)
+
+    def end(self):
+        """mark the end of a game"""
+        self.write(bytes([END]))
+
+
+def read_header(f):
+    """read a game header, or return None at the end of the file"""
+    offset = f.tell()
+    data = f.read(HEADER.size)
+    if not data:
+        return None
+    if len(data) < HEADER.size or data[0] != GAME:
+        raise ReplayError(f"No game header at offset {offset}")
+    marker, version, size, snapshot_every, initial, length = HEADER.unpack(data)
+    if version != VERSION:
+        raise ReplayError(f"Unknown replay version {version}")
+    seed = f.read(length).decode()
+    return Header(size, snapshot_every, initial, seed, offset, HEADER.size + length)
+
+
+def read_snapshot(f, size):
+    data = f.read(snapshot_size(size) - 1)
+    moves, score = struct.unpack_from("<IQ", data)
+    cells = data[SNAPSHOT_HEADER.size - 1:]
+    if len(cells) != size * size:
+        raise ReplayError("Truncated snapshot")
+    grid = [[1 << e if e else None for e in cells[r * size:(r + 1) * size]] for r in range(size)]
+    return Snapshot(moves, score, grid)
+
+
+def read_games(f):
+    """
+    yield a GameRecord for each game in an open replay file
+
+    Only one game is held in memory at a time, so files of any length can
+    be read. Moves are (direction, (row, col), value) tuples.
+    """
+    header = read_header(f)
+    while header is not None:
+        size = header.size
+        spawns = []
+        moves = []
+        snapshots = []
+        for _ in range(header.initial):
+            kind, cell = f.read(2)
+            spawns.append((divmod(cell, size), 4 if kind & 1 else 2))
+        next_header = None
+        while True:
+            kind = f.read(1)
+            if not kind or kind[0] == END:
+                next_header = read_header(f) if kind else None
+                break
+            kind = kind[0]
+            if kind == GAME:
+                f.seek(-1, 1)
+                next_header = read_header(f)
+                break
+            if kind == SNAPSHOT:
+                snapshots.append(read_snapshot(f, size))
+                continue
+            if kind > 7:
+                raise ReplayError(f"Unknown record {kind:#04x} in game at offset {header.offset}")
+            cell = f.read(1)
+            if not cell:
+                raise ReplayError("Truncated move")
+            moves.append((DIRECTIONS[kind & 3], divmod(cell[0], size), 4 if kind & 4 else 2))
+        yield GameRecord(header, spawns, moves, snapshots)
+        header = next_header
+
+
+def replay(record, until=None):
+    """the grid and score after playing a recorded game, or its first `until` moves"""
+    grid = core.empty_grid(record.header.size)
+    for (row, col), value in record.spawns:
+        grid[row][col] = value
+    score = 0
+    for direction, (row, col), value in record.moves[:until]:
+        grid, points, changed = core.move(grid, direction)
+        score += points
+        grid[row][col] = value
+    return grid, score
+
+
+def validate(record):
+    """check every move in a recorded game against core, raising ReplayError if one is wrong"""
+    size = record.header.size
+    grid = core.empty_grid(size)
+    for (row, col), value in record.spawns:
+        if grid[row][col]:
+            raise ReplayError("Starting tile placed on another tile")
+        grid[row][col] = value
+    snapshots = {s.moves: s for s in record.snapshots}
+    score = 0
+    for number, (direction, (row, col), value) in enumerate(record.moves, 1):
+        grid, points, changed = core.move(grid, direction)
+        if not changed:
+            raise ReplayError(f"Move {number} ({direction}) doesn't change the grid")
+        if grid[row][col]:
+            raise ReplayError(f"Move {number} spawns a tile on another tile")
+        grid[row][col] = value
+        score += points
+        snapshot = snapshots.get(number)
+        if snapshot and (snapshot.grid, snapshot.score) != (grid, score):
+            raise ReplayError(f"Snapshot after move {number} doesn't match the game")
+    return grid, score
+
+
+def seek(f, offset, moves):
+    """
+    the grid and score after a number of moves of the game starting at offset
+
+    Starts from the closest snapshot, so at most snapshot_every moves are
+    replayed however far into the game the move is.
+    """
+    f.seek(offset)
+    header = read_header(f)
+    size = header.size
+    every = header.snapshot_every
+    start = offset + header.length + 2 * header.initial
+    block = 2 * every + snapshot_size(size)
+    snapshot_number = moves // every
+    if snapshot_number:
+        f.seek(start + snapshot_number * block - snapshot_size(size))
+        if f.read(1) != bytes([SNAPSHOT]):
+            raise ReplayError(f"Game has fewer than {snapshot_number * every} moves")
+        snapshot = read_snapshot(f, size)
+        grid, score = snapshot.grid, snapshot.score
+    else:
+        f.seek(offset + header.length)
+        grid = core.empty_grid(size)
+        for _ in range(header.initial):
+            kind, cell = f.read(2)
+            row, col = divmod(cell, size)
+            grid[row][col] = 4 if kind & 1 else 2
+        score = 0
+    for _ in range(moves - snapshot_number * every):
+        data = f.read(2)
+        if len(data) < 2 or data[0] > 7:
+            raise ReplayError(f"Game has fewer than {moves} moves")
+        kind, cell = data
+        grid, points, changed = core.move(grid, DIRECTIONS[kind & 3])
+        score += points
+        row, col = divmod(cell, size)
+        grid[row][col] = 4 if kind & 4 else 2
+    return grid, score
+
+
+if __name__ == "__main__":
+    import sys
+    games = moves = 0
+    with open(sys.argv[1], "rb") as f:
+        for record in read_games(f):
+            validate(record)
+            games += 1
+            moves += len(record.moves)
+    print(f"{games} games and {moves} moves are valid")
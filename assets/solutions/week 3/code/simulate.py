@@ -0,0 +1,157 @@
+"""
+Play many games of 2048 without a user interface
+
+Games are played by a policy, a function which takes the current grid and a
+random.Random and returns the commands ("W", "A", "S" or "D") in order of
+preference. The first command which changes the grid is played, using
+Game.process_command exactly as interactive play does.
+
+Each game gets its own Random, seeded from the run seed and the game number,
+so a run gives the same results whatever the number of processes.
+
+    python simulate.py -n 1000 --seed 1 --policy corner --processes 4
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool
+
+import core
+import replay
+import stats
+from game import Game
+
+
+def random_policy(grid, rng):
+    """try the moves in a random order"""
+    commands = ["W", "A", "S", "D"]
+    rng.shuffle(commands)
+    return commands
+
+
+def corner_policy(grid, rng):
+    """keep the big tiles in the bottom left corner"""
+    return ["S", "A", "D", "W"]
+
+
+POLICIES = {
+    "random": random_policy,
+    "corner": corner_policy,
+}
+
+
+def get_policy(name):
+    """look a policy up by name, or import it from "module:function" """
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, function = name.partition(":")
+    if not function:
+        raise ValueError(f"Unknown policy {name!r}")
+    return getattr(importlib.import_module(module), function)
+
+
+def game_seed(seed, number):
+    """the seed for one game of a run"""
+    return f"{seed}:{number}"
+
+
+def play_game(number, seed=None, policy=random_policy, size=4, record=False, collect_stats=False):
+    """
+    play a single game to the end and return a summary of it
+
+    With record=True the summary includes the game's replay as bytes, and
+    with collect_stats=True a stats.Stats of the game's move timings.
+    """
+    start = time.perf_counter()
+    recorder = replay.ReplayWriter(io.BytesIO(), flush=False) if record else None
+    collected = stats.Stats() if collect_stats else None
+    # nobody can undo a headless game, so no history is kept
+    game = Game(seed=game_seed(seed, number), size=size, recorder=recorder, undo_depth=0,
+                stats=collected)
+    moves = 0
+    while not game.game_over:
+        for command in policy(game.grid, game.rng):
+            if game.directions[command] in game.legal:
+                game.process_command(command)
+                moves += 1
+                break
+        else:
+            raise RuntimeError(f"Policy {policy.__name__} found no move")
+    if recorder:
+        recorder.end()
+    result = {
+        "game": number,
+        "seed": game_seed(seed, number),
+        "score": game.score,
+        "max_tile": max(tile or 0 for row in game.grid for tile in row),
+        "moves": moves,
+        "seconds": time.perf_counter() - start,
+    }
+    if recorder:
+        result["replay"] = recorder.f.getvalue()
+    if collected:
+        result["stats"] = collected
+    return result
+
+
+def simulate(games, seed=None, policy=random_policy, processes=None, size=4, record=False,
+             collect_stats=False):
+    """
+    play a number of games across a pool of processes
+
+    Results are yielded as each game finishes, so they are not in game order.
+    """
+    play = partial(play_game, seed=seed, policy=policy, size=size, record=record,
+                   collect_stats=collect_stats)
+    # build the row tables up front so they aren't counted in the first game
+    core.get_row_table(size)
+    if processes == 1:
+        yield from map(play, range(games))
+        return
+    chunksize = max(1, games // ((processes or os.cpu_count()) * 8))
+    with Pool(processes, initializer=core.get_row_table, initargs=(size,)) as pool:
+        yield from pool.imap_unordered(play, range(games), chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play 2048 games without a user interface")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("--seed", default=0)
+    parser.add_argument("--policy", default="random",
+                        help=f"one of {', '.join(POLICIES)} or module:function")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--size", type=int, default=4, help="width and height of the grid")
+    parser.add_argument("--record", help="append a replay of every game to this file")
+    parser.add_argument("--stats", help="write move timings for all the games to this JSON file")
+    args = parser.parse_args(argv)
+
+    policy = get_policy(args.policy)
+    start = time.perf_counter()
+    total = 0
+    replays = open(args.record, "ab") if args.record else None
+    collected = stats.Stats() if args.stats else None
+    for result in simulate(args.games, args.seed, policy, args.processes, args.size,
+                           record=bool(replays), collect_stats=bool(collected)):
+        if replays:
+            replays.write(result.pop("replay"))
+        if collected:
+            collected.merge(result.pop("stats"))
+        print(json.dumps(result))
+        total += result["score"]
+    if replays:
+        replays.close()
+    if collected:
+        with open(args.stats, "w") as f:
+            f.write(collected.to_json(indent=2))
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games in {elapsed:.2f}s, "
+          f"mean score {total / max(args.games, 1):.1f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
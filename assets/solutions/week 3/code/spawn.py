@@ -0,0 +1,65 @@
+"""
+Placing new tiles on the 2048 grid
+
+Rather than picking random cells until an empty one turns up, the empty cells
+are listed and one is chosen from the list, so every spawn needs exactly one
+random choice however full the board is. Pass a seed (or a random.Random) to
+get the same sequence of tiles every time.
+
+For a list-of-lists grid the empty cells are found by scanning the whole
+grid, so a spawn costs O(size ** 2). No set of empty cells is kept up to
+date, because every move builds a new grid at the same cost anyway. Packed
+boards find their empty cells from a bitmask instead (spawn_board), but the
+games play on grids and only use spawn.
+"""
+from random import Random
+
+NEW_TILES = [2, 2, 2, 4]
+
+
+class BoardFull(ValueError):
+    """raised when a tile is spawned on a board with no empty cells"""
+
+
+def empty_cells(grid):
+    """the (row, col) position of every empty cell in a grid"""
+    return [(r, c) for r, row in enumerate(grid) for c, tile in enumerate(row) if not tile]
+
+
+def empty_shifts(board):
+    """the bit offset of every empty cell in a packed board"""
+    occupied = board | (board >> 1)
+    occupied |= occupied >> 2
+    empty = ~occupied & 0x1111111111111111
+    shifts = []
+    while empty:
+        lowest = empty & -empty
+        shifts.append(lowest.bit_length() - 1)
+        empty ^= lowest
+    return shifts
+
+
+class Spawner:
+    """Chooses where new tiles go and what they are"""
+    def __init__(self, rng=None, seed=None):
+        self.rng = rng or Random(seed)
+
+    def new_tile(self):
+        """the value of the next tile, 2 three times out of four, otherwise 4"""
+        return self.rng.choice(NEW_TILES)
+
+    def spawn(self, grid, value):
+        """put a tile in a random empty cell of the grid and return its position, scanning the grid for them"""
+        cells = empty_cells(grid)
+        if not cells:
+            raise BoardFull("No empty cell for a new tile")
+        row, col = self.rng.choice(cells)
+        grid[row][col] = value
+        return row, col
+
+    def spawn_board(self, board, exponent):
+        """a packed board with a new tile in a random empty cell"""
+        shifts = empty_shifts(board)
+        if not shifts:
+            raise BoardFull("No empty cell for a new tile")
+        return board | exponent << self.rng.choice(shifts)
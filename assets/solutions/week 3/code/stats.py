@@ -0,0 +1,102 @@
+"""
+Statistics about where the time goes in a turn of the game
+
+A Game given a Stats object times each phase of every move: making the
+move, spawning the new tile and checking for the end of the game. The
+points are worked out by core.move along with the move, so scoring is
+timed as part of the move phase. Times go into histograms with a bucket for each power of two
+microseconds, so memory stays the same however many moves are played.
+Moves which would not change the grid are counted, and every sample_every
+moves the tiles on the grid are counted too, giving the tile distribution
+as the game goes on.
+
+Without a Stats object the only cost to turn.play is checking for
+one, so it can be left in the code all the time.
+
+    python game.py --stats
+    python simulate.py -n 1000 --stats stats.json
+"""
+import json
+from collections import Counter
+
+PHASES = ("move", "spawn", "game_over")
+BUCKETS = 24
+
+
+def bucket(microseconds):
+    """the histogram bucket for a time, bucket i holds times under 2 ** i µs"""
+    return min(int(microseconds).bit_length(), BUCKETS - 1)
+
+
+class Stats:
+    """Histograms of move timings, unchanged moves and tile counts"""
+    def __init__(self, sample_every=10):
+        self.sample_every = sample_every
+        self.moves = 0
+        self.unchanged = 0
+        self.histograms = {phase: [0] * BUCKETS for phase in PHASES}
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.longest = dict.fromkeys(PHASES, 0.0)
+        # move number -> Counter of tile values on the grid after that move
+        self.tiles = {}
+
+    def record(self, start, moved, spawned, finished, grid):
+        """add the timestamps of one move, as given by time.perf_counter"""
+        times = (moved - start, spawned - moved, finished - spawned)
+        for phase, seconds in zip(PHASES, times):
+            microseconds = seconds * 1_000_000
+            self.histograms[phase][bucket(microseconds)] += 1
+            self.totals[phase] += microseconds
+            if microseconds > self.longest[phase]:
+                self.longest[phase] = microseconds
+        self.moves += 1
+        if self.moves % self.sample_every == 0:
+            self.tiles[self.moves] = Counter(tile for row in grid for tile in row if tile)
+
+    def merge(self, other):
+        """add the statistics collected by another Stats object, from another game or process"""
+        self.moves += other.moves
+        self.unchanged += other.unchanged
+        for phase in PHASES:
+            self.histograms[phase] = [a + b for a, b in zip(self.histograms[phase], other.histograms[phase])]
+            self.totals[phase] += other.totals[phase]
+            self.longest[phase] = max(self.longest[phase], other.longest[phase])
+        for number, tiles in other.tiles.items():
+            self.tiles.setdefault(number, Counter()).update(tiles)
+        return self
+
+    def percentile(self, phase, fraction):
+        """an upper bound in µs on the given fraction (0.99 is p99) of times for a phase"""
+        histogram = self.histograms[phase]
+        wanted = fraction * sum(histogram)
+        seen = 0
+        for i, count in enumerate(histogram):
+            seen += count
+            if count and seen >= wanted:
+                return 2 ** i
+        return 0
+
+    def snapshot(self):
+        """everything collected so far as a dictionary ready for json"""
+        phases = {}
+        for phase in PHASES:
+            phases[phase] = {
+                "total_us": self.totals[phase],
+                "mean_us": self.totals[phase] / self.moves if self.moves else 0.0,
+                "max_us": self.longest[phase],
+                "p50_us": self.percentile(phase, 0.5),
+                "p99_us": self.percentile(phase, 0.99),
+                "histogram": {f"<{2 ** i}us": n for i, n in enumerate(self.histograms[phase]) if n},
+            }
+        return {
+            "moves": self.moves,
+            "unchanged": self.unchanged,
+            "phases": phases,
+            "tiles": {
+                str(number): {str(value): n for value, n in sorted(tiles.items())}
+                for number, tiles in sorted(self.tiles.items())
+            },
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
@@ -1,8 +1,30 @@
 "Tests for the core 2048 functions"
 
+import io
+import json
+import os
+import tempfile
 import unittest
+from random import Random
+from types import SimpleNamespace
 
 import core
+import ai
+import benchmark
+import game
+import history
+import bitboard
+import replay
+import simulate
+import spawn
+import stats
+import turn
+
+try:
+    import numpy
+    import batch
+except ImportError:
+    numpy = None
 
 class TestStackLeft(unittest.TestCase):
 
@@ -74,8 +96,14 @@ class TestMergeLeft(unittest.TestCase):
         result = core.merge_left([64, 128, 256, 256])
         self.assertEqual(result, [64, 128, 512, None])
 
+    def test_longer_row(self):
+        "Rows can be longer than four tiles"
+        result = core.merge_left([2, 2, 4, 8, 8, 8])
+        self.assertEqual(result, [4, None, 4, 16, None, 8])
+
 
 class TestMove(unittest.TestCase):
+    core = core
 
     def test_empty(self):
         "An empty grid is unaffected by a merge"
@@ -84,8 +112,8 @@ class TestMove(unittest.TestCase):
                  [None, None, None, None], 
                  [None, None, None, None]]
 
-        self.assertEqual(core.move_left(input), input)
-        self.assertEqual(core.move_right(input), input)
+        self.assertEqual(self.core.move_left(input), input)
+        self.assertEqual(self.core.move_right(input), input)
 
     def test_value_after_pair(self):
         "The additional tile on each row should be stacked into the merged pair"
@@ -104,8 +132,8 @@ class TestMove(unittest.TestCase):
                  [None, None, 2,  4], 
                  [None, None, 32, 4]]
 
-        self.assertEqual(core.move_left(input), left)
-        self.assertEqual(core.move_right(input), right)
+        self.assertEqual(self.core.move_left(input), left)
+        self.assertEqual(self.core.move_right(input), right)
 
     def test_all_twos(self):
         "Two pairs are both merged and stacked"
@@ -124,8 +152,8 @@ class TestMove(unittest.TestCase):
                  [None, None, 4, 4], 
                  [None, None, 4, 4]]
 
-        self.assertEqual(core.move_left(input), left)
-        self.assertEqual(core.move_right(input), right)
+        self.assertEqual(self.core.move_left(input), left)
+        self.assertEqual(self.core.move_right(input), right)
 
 class TestReverse(unittest.TestCase):
 
@@ -185,6 +213,14 @@ class TestVerticalMerges(unittest.TestCase):
                   [13, 10, 15, 16]]
         self.assertTrue(core.has_vertical_merges(input))
 
+    def test_empty_cells(self):
+        "Two empty cells next to each other are not a merge"
+        input  = [[ 1,    2,  3,  4], 
+                  [ 5, None,  7,  8], 
+                  [ 9, None, 11, 12], 
+                  [13,   14, 15, 16]]
+        self.assertFalse(core.has_vertical_merges(input))
+
 class TestHorizontalMerges(unittest.TestCase):
 
     def test_no_merges(self):
@@ -201,38 +237,751 @@ class TestHorizontalMerges(unittest.TestCase):
                   [13, 14, 15, 16]]
         self.assertTrue(core.has_horizontal_merges(input))
 
+    def test_empty_cells(self):
+        "Two empty cells next to each other are not a merge"
+        input  = [[ 1,  2,    3,    4], 
+                  [ 5,  6,    7,    8], 
+                  [ 9, 10, None, None], 
+                  [13, 14,   15,   16]]
+        self.assertFalse(core.has_horizontal_merges(input))
+
 class TestHorizontalPoints(unittest.TestCase):
+    core = core
 
     def test_no_points(self):
         input  = [[None, None, None, None], 
                   [   2,    4,    8,    4], 
                   [   2,    4,    8,    4], 
                   [   2,    4,    8,    4]]
-        self.assertEqual(core.horizontal_points(input), 0)
+        self.assertEqual(self.core.horizontal_points(input), 0)
 
     def test_some_points(self):
         input  = [[None, None, None, None], 
                   [   2,    2,    8,    4], 
                   [   2,    4,    8,    8], 
                   [   2,    4,    8,    4]]
-        self.assertEqual(core.horizontal_points(input), 20)
+        self.assertEqual(self.core.horizontal_points(input), 20)
 
 class TestVerticalPoints(unittest.TestCase):
+    core = core
 
     def test_no_points(self):
         input  = [[None, None, None, None], 
                   [   2, None,    8,    4], 
                   [   4,    8,    4,    2], 
                   [   2,    4,    8,    4]]
-        self.assertEqual(core.vertical_points(input), 0)
+        self.assertEqual(self.core.vertical_points(input), 0)
 
     def test_some_points(self):
         input  = [[None, None, None, None], 
                   [   2,    2,    8,    4], 
                   [   2,    4,    8,    8], 
                   [   2,    4,    8,    4]]
-        self.assertEqual(core.vertical_points(input), 28)
+        self.assertEqual(self.core.vertical_points(input), 28)
+
+
+class TestIsGameOver(unittest.TestCase):
+    core = core
+
+    def test_gaps(self):
+        input  = [[   2,    4,    8,   16], 
+                  [  32,   64,  128,  256], 
+                  [ 512, 1024, 2048, 4096], 
+                  [8192,  256,  128, None]]
+        self.assertFalse(self.core.is_game_over(input))
+
+    def test_merge_available(self):
+        input  = [[   2,    4,    8,   16], 
+                  [  32,   64,  128,  256], 
+                  [ 512, 1024, 2048, 4096], 
+                  [8192,  256,  128, 4096]]
+        self.assertFalse(self.core.is_game_over(input))
+
+    def test_game_over(self):
+        input  = [[   2,    4,    8,   16], 
+                  [  32,   64,  128,  256], 
+                  [ 512, 1024, 2048, 4096], 
+                  [   2,    4,    8,   16]]
+        self.assertTrue(self.core.is_game_over(input))
+
+
+def packed(function, unpack=True):
+    "Wrap a bitboard function so it takes (and optionally returns) a grid"
+    def wrapper(grid):
+        result = function(bitboard.from_grid(grid))
+        return bitboard.to_grid(result) if unpack else result
+    return wrapper
+
+# The same tests run against the packed representation
+bitcore = SimpleNamespace(
+    move_left=packed(bitboard.move_left),
+    move_right=packed(bitboard.move_right),
+    move_up=packed(bitboard.move_up),
+    move_down=packed(bitboard.move_down),
+    horizontal_points=packed(bitboard.horizontal_points, unpack=False),
+    vertical_points=packed(bitboard.vertical_points, unpack=False),
+    is_game_over=packed(bitboard.is_game_over, unpack=False),
+)
+
+class TestBitboardMove(TestMove):
+    core = bitcore
+
+class TestBitboardHorizontalPoints(TestHorizontalPoints):
+    core = bitcore
+
+class TestBitboardVerticalPoints(TestVerticalPoints):
+    core = bitcore
+
+class TestBitboardIsGameOver(TestIsGameOver):
+    core = bitcore
+
+
+def random_grid(rng, fill=0.6, largest=11):
+    "A grid of random powers of two with some gaps"
+    return [[2 ** rng.randint(1, largest) if rng.random() < fill else None
+             for col in range(4)] for row in range(4)]
+
+class TestBitboard(unittest.TestCase):
+
+    def test_round_trip(self):
+        "Packing and unpacking a grid is lossless"
+        rng = Random(1)
+        for _ in range(100):
+            grid = random_grid(rng, largest=15)
+            self.assertEqual(bitboard.to_grid(bitboard.from_grid(grid)), grid)
+
+    def test_invalid_value(self):
+        "Only powers of two up to 2**15 can be packed"
+        with self.assertRaises(ValueError):
+            bitboard.from_grid([[3, None, None, None]])
+        with self.assertRaises(ValueError):
+            bitboard.from_grid([[2 ** 16, None, None, None]])
+
+    def test_transpose(self):
+        "Transposing the packed board matches transposing the grid"
+        grid = random_grid(Random(2), fill=1, largest=15)
+        board = bitboard.transpose(bitboard.from_grid(grid))
+        self.assertEqual(bitboard.to_grid(board), core.transpose(grid))
+
+    def test_matches_core(self):
+        "Every move and score matches core on random grids"
+        rng = Random(3)
+        for _ in range(200):
+            grid = random_grid(rng, fill=rng.random())
+            for name in ["move_left", "move_right", "move_up", "move_down",
+                         "horizontal_points", "vertical_points", "is_game_over"]:
+                self.assertEqual(getattr(bitcore, name)(grid), getattr(core, name)(grid))
+
+
+class TestRowTables(unittest.TestCase):
+
+    def test_matches_row_left(self):
+        "The table entries agree with the step-by-step row functions"
+        for row in range(0, bitboard.ROW_COUNT, 97):
+            grid_row = bitboard.to_grid(row)[0]
+            self.assertEqual(core.lookup_row(grid_row), core.calculate_row(grid_row))
+
+    def test_changed(self):
+        "The changed flags record which directions move a row"
+        left, right, points, changed = core.lookup_row([2, None, None, 4])
+        self.assertEqual(changed, bitboard.LEFT_CHANGED | bitboard.RIGHT_CHANGED)
+        left, right, points, changed = core.lookup_row([2, 4, None, None])
+        self.assertEqual(changed, bitboard.RIGHT_CHANGED)
+        left, right, points, changed = core.lookup_row([2, 4, 8, 16])
+        self.assertEqual(changed, 0)
+
+    def test_two_largest_tiles(self):
+        "Rows the packed tables can't merge correctly are calculated instead"
+        row = [32768, 32768, None, 2]
+        self.assertIsNone(core.packed_entry(row))
+        self.assertEqual(core.lookup_row(row), core.calculate_row(row))
+        self.assertEqual(core.lookup_row(row)[0], (65536, 2, None, None))
+
+    def test_cache_limit(self):
+        "A table that fills up as rows are seen never holds more than MAX_CACHED_ROWS"
+        rng = Random(4)
+        limit = core.MAX_CACHED_ROWS
+        core.MAX_CACHED_ROWS = 100
+        try:
+            for _ in range(1000):
+                row = [rng.choice([None, 2, 4, 8, 16, 32]) for _ in range(7)]
+                self.assertEqual(core.lookup_row(row), core.calculate_row(row))
+                self.assertLessEqual(len(core.get_row_table(7)), 100)
+        finally:
+            core.MAX_CACHED_ROWS = limit
+
+    def test_fallback(self):
+        "Rows that aren't in the table are calculated instead"
+        self.assertEqual(core.move_left([[3, 3, None, 5]]), [[6, 5, None, None]])
+        self.assertEqual(core.horizontal_points([[3, 3, None, 5]]), 6)
+
+    def test_save_and_load(self):
+        "Tables written to disk are read back unchanged"
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "tables.bin")
+            bitboard.save_tables(path)
+            self.assertEqual(bitboard.load_tables(path), bitboard.get_tables())
+
+    def test_load_invalid(self):
+        "Loading something other than a table file is an error"
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "tables.bin")
+            with open(path, "wb") as f:
+                f.write(bitboard.TABLE_MAGIC + b"short")
+            with self.assertRaises(ValueError):
+                bitboard.load_tables(path)
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        rng = Random(4)
+        self.grids = [random_grid(rng, fill=rng.random()) for _ in range(200)]
+        self.grids.append([[2, 4, 8, 16], [32, 64, 128, 256],
+                           [512, 1024, 2048, 4096], [2, 4, 8, 16]])
+        self.array = numpy.array([[[v or 0 for v in row] for row in grid] for grid in self.grids])
+
+    def check(self, boards, packed):
+        moves = [core.move_left, core.move_right, core.move_up, core.move_down]
+        points = [core.horizontal_points, core.horizontal_points,
+                  core.vertical_points, core.vertical_points]
+        directions = numpy.arange(len(self.grids)) % 4
+        next_boards, gained, changed, game_over = batch.move(boards, directions)
+        if packed:
+            next_boards = batch.unpack(next_boards)
+        for i, grid in enumerate(self.grids):
+            expected = moves[directions[i]](grid)
+            result = [[v or None for v in row] for row in next_boards[i].tolist()]
+            self.assertEqual(result, expected)
+            self.assertEqual(gained[i], points[directions[i]](grid))
+            self.assertEqual(changed[i], expected != grid)
+            self.assertEqual(game_over[i], core.is_game_over(expected))
+
+    def test_grids(self):
+        "Moving an (N, 4, 4) array matches core board for board"
+        self.check(self.array, packed=False)
+
+    def test_packed(self):
+        "Moving an (N,) array of packed boards matches core board for board"
+        boards = batch.pack(self.array)
+        self.assertEqual(boards.tolist(), [bitboard.from_grid(g) for g in self.grids])
+        self.check(boards, packed=True)
+
+    def test_is_game_over(self):
+        "The game over mask matches core"
+        expected = [core.is_game_over(grid) for grid in self.grids]
+        self.assertEqual(batch.is_game_over(self.array).tolist(), expected)
+
+    def test_invalid_value(self):
+        "Only powers of two can be packed"
+        with self.assertRaises(ValueError):
+            batch.pack([[[3, 0, 0, 0]] * 4])
+
+
+class TestSimulate(unittest.TestCase):
+
+    def test_reproducible(self):
+        "The same seed plays the same game"
+        first = simulate.play_game(5, seed=1)
+        second = simulate.play_game(5, seed=1)
+        del first["seconds"], second["seconds"]
+        self.assertEqual(first, second)
+
+    def test_policy(self):
+        "A game played by a policy runs to the end"
+        result = simulate.play_game(0, seed=2, policy=simulate.corner_policy)
+        self.assertGreater(result["moves"], 0)
+        self.assertGreaterEqual(result["max_tile"], 4)
+
+    def test_simulate(self):
+        "Running in a single process gives one result per game"
+        results = list(simulate.simulate(3, seed=3, processes=1))
+        self.assertEqual(sorted(r["game"] for r in results), [0, 1, 2])
+
+
+class TestSolver(unittest.TestCase):
+
+    def test_only_move(self):
+        "When only one move changes the grid the solver picks it"
+        grid = [[2, 4, 8, 16],
+                [4, 8, 16, 32],
+                [8, 16, 32, 64],
+                [None, None, None, None]]
+        self.assertEqual(core.legal_moves(grid), {"down"})
+        self.assertEqual(ai.Solver(budget_ms=50).best_move(grid), "down")
+
+    def test_unpackable_tile(self):
+        "A tile too big for a packed board gets the first legal move instead of an error"
+        grid = [[65536, 4, 8, 16],
+                [4, 8, 16, 32],
+                [8, 16, 32, 64],
+                [None, None, None, None]]
+        self.assertEqual(ai.Solver().best_move(grid), "down")
+        grid[3] = [16, 32, 64, 128]
+        self.assertIsNone(ai.Solver().best_move(grid))
+
+    def test_no_move(self):
+        "A finished game has no best move"
+        grid = [[2, 4, 8, 16],
+                [4, 8, 16, 32],
+                [8, 16, 32, 64],
+                [16, 32, 64, 128]]
+        self.assertIsNone(ai.Solver().best_move(grid))
+
+    def test_heuristic(self):
+        "The heuristic decides which move is best"
+        grid = [[2, None, None, None],
+                [None, None, None, None],
+                [None, None, None, None],
+                [None, None, None, 4]]
+        corner = lambda board: board & 0xF
+        move = ai.Solver(heuristic=corner, budget_ms=50, max_depth=1).best_move(grid)
+        self.assertIn(move, ["up", "left"])
+
+    def test_table_size(self):
+        "The transposition table never grows beyond its limit"
+        solver = ai.Solver(budget_ms=50, table_size=100)
+        solver.best_move(random_grid(Random(5), fill=0.5, largest=4))
+        self.assertLessEqual(len(solver.table), 100)
+        self.assertGreater(solver.nodes, 0)
+
+
+class TestSpawner(unittest.TestCase):
+
+    def test_fills_empty_cell(self):
+        "A new tile always lands in an empty cell"
+        grid = [[2, 2, 2, 2],
+                [2, 2, 2, 2],
+                [2, 2, 2, 2],
+                [2, 2, 2, None]]
+        position = spawn.Spawner(seed=1).spawn(grid, 4)
+        self.assertEqual(position, (3, 3))
+        self.assertEqual(grid[3][3], 4)
+
+    def test_full_board(self):
+        "Spawning on a full board raises rather than looping forever"
+        grid = [[2, 4], [4, 2]]
+        with self.assertRaises(spawn.BoardFull):
+            spawn.Spawner(seed=1).spawn(grid, 2)
+        with self.assertRaises(spawn.BoardFull):
+            spawn.Spawner(seed=1).spawn_board(0x1111111111111111, 1)
+
+    def test_seeded(self):
+        "The same seed spawns the same tiles in the same places"
+        def tiles(seed):
+            spawner = spawn.Spawner(seed=seed)
+            grid = [[None] * 4 for _ in range(4)]
+            return [(spawner.spawn(grid, spawner.new_tile()), grid) for _ in range(16)]
+        self.assertEqual(tiles(7), tiles(7))
+        self.assertNotEqual(tiles(7), tiles(8))
+
+    def test_board_matches_grid(self):
+        "The packed board and the grid agree on the empty cells"
+        grid = random_grid(Random(6), fill=0.5)
+        shifts = spawn.empty_shifts(bitboard.from_grid(grid))
+        cells = spawn.empty_cells(grid)
+        self.assertEqual(shifts, [4 * (4 * r + c) for r, c in cells])
+
+    def test_uniform(self):
+        "Each empty cell is equally likely"
+        spawner = spawn.Spawner(seed=2)
+        counts = {}
+        for _ in range(3000):
+            grid = [[2, None, 2, None]]
+            position = spawner.spawn(grid, 2)
+            counts[position] = counts.get(position, 0) + 1
+        self.assertEqual(set(counts), {(0, 1), (0, 3)})
+        self.assertLess(abs(counts[(0, 1)] - 1500), 150)
+
+
+class TestLegalMoves(unittest.TestCase):
+    moves = {
+        "left": core.move_left,
+        "right": core.move_right,
+        "up": core.move_up,
+        "down": core.move_down,
+    }
 
+    def test_empty(self):
+        "Nothing can move on an empty grid"
+        grid = [[None] * 4 for _ in range(4)]
+        self.assertEqual(core.legal_moves(grid), set())
+
+    def test_corner(self):
+        "A tile in the top left corner can only move right or down"
+        grid = [[2, None, None, None]] + [[None] * 4 for _ in range(3)]
+        self.assertEqual(core.legal_moves(grid), {"right", "down"})
+
+    def test_matches_moves(self):
+        "A direction is legal exactly when moving changes the grid"
+        rng = Random(7)
+        for _ in range(200):
+            grid = random_grid(rng, fill=rng.random(), largest=4)
+            expected = {d for d, move in self.moves.items() if move(grid) != grid}
+            self.assertEqual(core.legal_moves(grid), expected)
+            self.assertEqual(bitboard.legal_moves(bitboard.from_grid(grid)), expected)
+            if any(any(row) for row in grid):
+                self.assertEqual(not expected, core.is_game_over(grid))
+
+    def test_dead_direction(self):
+        "A move in a dead direction changes nothing and spawns nothing"
+        g = game.Game(seed=1)
+        g.grid = [[2, None, None, None]] + [[None] * 4 for _ in range(3)]
+        g.legal = core.legal_moves(g.grid)
+        before = g.grid
+        g.process_command("A")
+        self.assertIs(g.grid, before)
+        g.process_command("D")
+        self.assertEqual(sum(1 for row in g.grid for t in row if t), 2)
+
+
+class TestSinglePassMove(unittest.TestCase):
+
+    def test_matches_separate_functions(self):
+        "core.move agrees with the move and points functions"
+        moves = {
+            "left": (core.move_left, core.horizontal_points),
+            "right": (core.move_right, core.horizontal_points),
+            "up": (core.move_up, core.vertical_points),
+            "down": (core.move_down, core.vertical_points),
+        }
+        rng = Random(8)
+        for _ in range(200):
+            grid = random_grid(rng, fill=rng.random(), largest=5)
+            for direction, (move, points) in moves.items():
+                expected = move(grid)
+                self.assertEqual(core.move(grid, direction),
+                                 (expected, points(grid), expected != grid))
+
+    def test_unknown_direction(self):
+        "Only the four directions are allowed"
+        with self.assertRaises(KeyError):
+            core.move([[None] * 4] * 4, "sideways")
+
+
+class TestBoardSizes(unittest.TestCase):
+
+    def test_moves(self):
+        "Grids of every size move like their rows do"
+        rng = Random(9)
+        for size in range(2, 9):
+            for _ in range(20):
+                grid = [[2 ** rng.randint(1, 4) if rng.random() < 0.6 else None
+                         for col in range(size)] for row in range(size)]
+                expected = [core.row_left(row) for row in grid]
+                self.assertEqual(core.move_left(grid), expected)
+                self.assertEqual(core.move(grid, "left"),
+                                 (expected, core.horizontal_points(grid), expected != grid))
+                self.assertEqual(core.horizontal_points(grid),
+                                 sum(core.row_points(row) for row in grid))
+
+    def test_game_over(self):
+        "A full 3x3 grid with no merges is game over"
+        grid = [[2, 4, 2],
+                [4, 2, 4],
+                [2, 4, 2]]
+        self.assertTrue(core.is_game_over(grid))
+        self.assertEqual(core.legal_moves(grid), set())
+
+    def test_play(self):
+        "A game on a small grid can be played to the end"
+        result = simulate.play_game(0, seed=1, size=3)
+        self.assertGreater(result["moves"], 0)
+        g = game.Game(seed=1, size=5)
+        self.assertEqual(len(g.grid), 5)
+        self.assertEqual(sum(1 for row in g.grid for t in row if t), 2)
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_regressions(self):
+        "Only slowdowns beyond the threshold count as regressions"
+        baseline = {"fast": 1.0, "slow": 1.0, "new": None}
+        results = {"fast": 1.1, "slow": 1.5, "new": 2.0, "unknown": 3.0}
+        slower = benchmark.regressions(results, baseline, threshold=0.2)
+        self.assertEqual(list(slower), ["slow"])
+        self.assertAlmostEqual(slower["slow"], 0.5)
+
+    def test_sample_grids(self):
+        "The sample grids are reproducible"
+        self.assertEqual(benchmark.sample_grids(50, seed=1), benchmark.sample_grids(50, seed=1))
+
+
+class TestSlides(unittest.TestCase):
+
+    def test_row(self):
+        "Tiles slide to the left and pairs end up in the same place"
+        self.assertEqual(core.row_slides([2, 2, 2, None]), [(0, 0), (1, 0), (2, 1)])
+        self.assertEqual(core.row_slides([None, 4, None, 8]), [(1, 0), (3, 1)])
+
+    def test_matches_move(self):
+        "Following the slides puts every tile where the move puts it"
+        rng = Random(10)
+        for _ in range(100):
+            grid = random_grid(rng, fill=rng.random(), largest=3)
+            for direction in core.DIRECTIONS:
+                result = core.empty_grid()
+                for (r0, c0), (r1, c1) in core.slides(grid, direction):
+                    result[r1][c1] = (result[r1][c1] or 0) + grid[r0][c0]
+                self.assertEqual(result, core.move(grid, direction)[0])
+
+
+class TestReplay(unittest.TestCase):
+
+    def record(self, games=3, snapshot_every=8):
+        "Play some games with random moves, recording them into a buffer"
+        f = io.BytesIO()
+        writer = replay.ReplayWriter(f, snapshot_every=snapshot_every)
+        rng = Random(11)
+        played = []
+        for number in range(games):
+            g = game.Game(seed=number, recorder=writer)
+            while not g.game_over:
+                g.process_command(rng.choice("WASD"))
+            writer.end()
+            played.append(g)
+        f.seek(0)
+        return f, played
+
+    def test_round_trip(self):
+        "Replaying a recorded game gives the same grid and score"
+        f, played = self.record()
+        records = list(replay.read_games(f))
+        self.assertEqual(len(records), len(played))
+        for record, g in zip(records, played):
+            self.assertEqual(replay.replay(record), (g.grid, g.score))
+            self.assertEqual(replay.validate(record), (g.grid, g.score))
+            self.assertEqual(len(record.snapshots), len(record.moves) // 8)
+
+    def test_unknown_record(self):
+        "A byte that isn't a move, snapshot, game or end is an error, not a move"
+        f, played = self.record(games=1)
+        data = f.getvalue()
+        header = next(replay.read_games(io.BytesIO(data))).header
+        start = header.length + 2 * header.initial
+        for stray in (0x08, 0x42):
+            broken = data[:start] + bytes([stray, 0]) + data[start:]
+            with self.assertRaises(replay.ReplayError):
+                list(replay.read_games(io.BytesIO(broken)))
+
+    def test_large_grid(self):
+        "Grids with more cells than fit in a byte are refused before anything is written"
+        f = io.BytesIO()
+        writer = replay.ReplayWriter(f)
+        self.assertRaises(replay.ReplayError, game.Game, seed=1, size=17, recorder=writer)
+        self.assertEqual(f.getvalue(), b"")
+        g = game.Game(seed=1, size=16, recorder=writer)
+        self.assertTrue(f.getvalue())
+
+    def test_compact(self):
+        "Each move takes two bytes plus the occasional snapshot"
+        f, played = self.record(games=1, snapshot_every=1000)
+        record = next(replay.read_games(f))
+        header = record.header.length + 2 * record.header.initial + 1
+        self.assertEqual(len(f.getvalue()), header + 2 * len(record.moves))
+
+    def test_seek(self):
+        "Jumping to a move gives the same position as replaying up to it"
+        f, played = self.record(games=2)
+        records = list(replay.read_games(f))
+        for record in records:
+            for moves in [0, 1, 7, 8, 9, 16, len(record.moves)]:
+                expected = replay.replay(record, until=moves)
+                self.assertEqual(replay.seek(f, record.header.offset, moves), expected)
+
+    def test_invalid_move(self):
+        "A move that puts a tile on another tile is rejected"
+        f = io.BytesIO()
+        writer = replay.ReplayWriter(f)
+        writer.start()
+        writer.spawn((0, 0), 2)
+        writer.spawn((0, 3), 2)
+        writer.move("left", (0, 0), 2, None, 4)
+        f.seek(0)
+        record = next(replay.read_games(f))
+        self.assertEqual(record.moves, [("left", (0, 0), 2)])
+        with self.assertRaises(replay.ReplayError):
+            replay.validate(record)
+
+
+
+class TestHistory(unittest.TestCase):
+
+    def play(self, size=4, moves=30, depth=1000):
+        "Play random moves, keeping every position along the way"
+        rng = Random(5)
+        g = game.Game(seed=5, size=size, undo_depth=depth)
+        positions = [([list(row) for row in g.grid], g.score)]
+        while len(positions) <= moves and not g.game_over:
+            before = g.grid
+            g.process_command(rng.choice("WASD"))
+            if g.grid is not before:
+                positions.append(([list(row) for row in g.grid], g.score))
+        return g, positions
+
+    def test_pack(self):
+        "Packing and unpacking gives back the same grid at any size"
+        rng = Random(2)
+        for size in [3, 4, 5, 8]:
+            for _ in range(20):
+                grid = [[2 ** rng.randint(1, 15) if rng.random() < 0.6 else None
+                         for col in range(size)] for row in range(size)]
+                self.assertEqual(history.unpack(history.pack(grid), size), grid)
+
+    def test_undo_redo(self):
+        "Undoing every move and redoing them all again visits every position"
+        for size in [4, 5]:
+            g, positions = self.play(size)
+            for position in reversed(positions[:-1]):
+                self.assertTrue(g.undo())
+                self.assertEqual((g.grid, g.score), position)
+            self.assertFalse(g.undo())
+            for position in positions[1:]:
+                self.assertTrue(g.redo())
+                self.assertEqual((g.grid, g.score), position)
+            self.assertFalse(g.redo())
+
+    def test_save_clears_redo(self):
+        "Making a move after an undo forgets the moves that were undone"
+        g, positions = self.play()
+        g.undo()
+        g.undo()
+        move = next(d for d in "WASD" if g.directions[d] in g.legal)
+        g.process_command(move)
+        self.assertFalse(g.redo())
+        self.assertTrue(g.undo())
+
+    def test_depth(self):
+        "Only the most recent depth moves can be undone"
+        g, positions = self.play(depth=5)
+        for _ in range(5):
+            self.assertTrue(g.undo())
+        self.assertFalse(g.undo())
+        self.assertEqual((g.grid, g.score), positions[-6])
+
+    def test_tile_above_32768(self):
+        "Merging two 32768s still leaves a position that can be saved and undone"
+        g = game.Game(seed=1)
+        g.set_position([[32768, 32768, 2, None],
+                        [None, None, None, None],
+                        [None, None, None, None],
+                        [None, None, None, None]], 0)
+        g.process_command("A")
+        self.assertEqual(g.grid[0][0], 65536)
+        after = ([list(row) for row in g.grid], g.score)
+        move = next(d for d in "WASD" if g.directions[d] in g.legal)
+        g.process_command(move)
+        self.assertTrue(g.undo())
+        self.assertEqual((g.grid, g.score), after)
+        self.assertTrue(g.undo())
+        self.assertTrue(g.redo())
+        self.assertEqual((g.grid, g.score), after)
+
+    def test_depth_zero(self):
+        "A depth of 0 turns undo off instead of failing on the first move"
+        for size in [4, 5]:
+            g, positions = self.play(size, depth=0)
+            self.assertGreater(len(positions), 1)
+            self.assertFalse(g.undo())
+            self.assertFalse(g.redo())
+        self.assertRaises(ValueError, history.History, depth=-1)
+
+    def test_bytes_per_move(self):
+        "A 4x4 history stores each move in 16 bytes"
+        h = history.History(depth=10_000)
+        self.assertLess(h.bytes_per_move(), 16.1)
+
+    def test_no_undo_while_recording(self):
+        "A recorded game can't be undone because the replay only goes forwards"
+        writer = replay.ReplayWriter(io.BytesIO())
+        g = game.Game(seed=1, recorder=writer)
+        move = next(d for d in "WASD" if g.directions[d] in g.legal)
+        g.process_command(move)
+        self.assertFalse(g.undo())
+
+
+class TestStats(unittest.TestCase):
+
+    def play(self, seed=3):
+        "Play random commands, including ones that don't change the grid"
+        rng = Random(seed)
+        collected = stats.Stats(sample_every=5)
+        g = game.Game(seed=seed, stats=collected)
+        changed = unchanged = 0
+        while not g.game_over:
+            before = g.grid
+            g.process_command(rng.choice("WASD"))
+            if g.grid is before:
+                unchanged += 1
+            else:
+                changed += 1
+        return collected, changed, unchanged
+
+    def test_counts(self):
+        "Every move is timed once in each phase and unchanged moves are counted"
+        collected, changed, unchanged = self.play()
+        self.assertEqual(collected.moves, changed)
+        self.assertEqual(collected.unchanged, unchanged)
+        for phase in stats.PHASES:
+            self.assertEqual(sum(collected.histograms[phase]), changed)
+        self.assertEqual(sorted(collected.tiles), list(range(5, changed + 1, 5)))
+        for tiles in collected.tiles.values():
+            self.assertTrue(all(value & (value - 1) == 0 for value in tiles))
+
+    def test_merge(self):
+        "Merged statistics add up the moves of both games"
+        first = self.play(1)[0]
+        second = self.play(2)[0]
+        moves = first.moves + second.moves
+        merged = stats.Stats(sample_every=5).merge(first).merge(second)
+        self.assertEqual(merged.moves, moves)
+        self.assertEqual(merged.tiles[5], first.tiles[5] + second.tiles[5])
+
+    def test_snapshot(self):
+        "The snapshot can be written as JSON"
+        collected = self.play()[0]
+        snapshot = json.loads(collected.to_json())
+        self.assertEqual(snapshot["moves"], collected.moves)
+        self.assertEqual(set(snapshot["phases"]), set(stats.PHASES))
+        for phase in snapshot["phases"].values():
+            self.assertEqual(sum(phase["histogram"].values()), collected.moves)
+            self.assertLessEqual(phase["p50_us"], phase["p99_us"])
+
+    def test_off(self):
+        "Without stats a game plays the same moves"
+        rng = Random(3)
+        g = game.Game(seed=3)
+        with_stats = game.Game(seed=3, stats=stats.Stats())
+        while not g.game_over:
+            command = rng.choice("WASD")
+            g.process_command(command)
+            with_stats.process_command(command)
+            self.assertEqual(g.grid, with_stats.grid)
+
+
+class TestTurn(unittest.TestCase):
+
+    def test_unchanged(self):
+        "A move that wouldn't change the grid isn't made or saved"
+        grid = [[2, 4], [None, None]]
+        h = history.History(2)
+        collected = stats.Stats()
+        result = turn.play(grid, 0, core.legal_moves(grid), "left", spawn.Spawner(seed=1), h, collected)
+        self.assertIsNone(result)
+        self.assertEqual(len(h), 0)
+        self.assertEqual(collected.unchanged, 1)
+
+    def test_play(self):
+        "A move scores its points, spawns one tile and can be undone"
+        grid = [[2, 2], [None, None]]
+        h = history.History(2)
+        grid_after, score, legal = turn.play(grid, 10, core.legal_moves(grid), "left", spawn.Spawner(seed=1), h)
+        self.assertEqual(score, 14)
+        self.assertEqual(sum(1 for row in grid_after for tile in row if tile), 2)
+        self.assertEqual(legal, core.legal_moves(grid_after))
+        self.assertEqual(turn.undo(grid_after, score, h), (grid, 10))
+        self.assertIsNone(turn.undo(grid_after, score, h, recorder=object()))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,52 @@
+"""
+One turn of 2048, shared by the console and tkinter games
+
+A turn saves the position for undo, makes the move, adds the points, spawns
+a new tile and works out which moves are legal next, timing each phase for
+an optional stats.Stats and writing the move to an optional
+replay.ReplayWriter. Both Game classes call play, undo and redo here, so
+the rules of a turn are only written once and can't drift apart.
+"""
+from time import perf_counter
+
+import core
+
+
+def play(grid, score, legal, direction, spawner, history, stats=None, recorder=None):
+    """
+    make a move and spawn a tile, if the move changes the grid
+
+    Returns the new grid, score and set of legal moves, or None if the move
+    wouldn't change the grid, in which case it isn't made.
+    """
+    if direction not in legal:
+        if stats:
+            stats.unchanged += 1
+        return None
+    history.save(grid, score)
+    # timings are only taken when a stats.Stats is collecting them
+    start = stats and perf_counter()
+    # the points come from the same table lookups, so scoring is timed with the move
+    grid, points, changed = core.move(grid, direction)
+    score += points
+    moved = stats and perf_counter()
+    new_tile = spawner.new_tile()
+    position = spawner.spawn(grid, new_tile)
+    spawned = stats and perf_counter()
+    legal = core.legal_moves(grid)
+    if stats:
+        stats.record(start, moved, spawned, perf_counter(), grid)
+    if recorder:
+        recorder.move(direction, position, new_tile, grid, score)
+    return grid, score, legal
+
+
+def undo(grid, score, history, recorder=None):
+    """the position before the last move, or None if there is nothing to undo"""
+    # a replay can only record moves forwards
+    return None if recorder else history.undo(grid, score)
+
+
+def redo(grid, score, history, recorder=None):
+    """the position undone most recently, or None if there is nothing to redo"""
+    return None if recorder else history.redo(grid, score)